@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .caching import make_key
+
+TOKEN_CACHE_PREFIX = 'auth-token'
+# Поля пользователя в кэше: права доступа и профиль, который отдаёт
+# API. Хэш пароля и остальные поля в кэш не попадают и загружаются
+# из базы при первом обращении как отложенные поля модели.
+CACHED_USER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def token_cache_key(key):
+    return make_key(TOKEN_CACHE_PREFIX, key)
+
+
+def invalidate_tokens(user_id):
+    """Сбрасывает закэшированные токены пользователя."""
+    keys = [
+        token_cache_key(key)
+        for key in Token.objects.filter(
+            user_id=user_id).values_list('key', flat=True)
+    ]
+    invalidate_keys(keys)
+
+
+def invalidate_keys(keys):
+    """Удаляет ключи сразу и повторно после коммита, чтобы
+    параллельный запрос не закэшировал ещё не изменённые данные."""
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый вызов API.
+
+    Снимок пользователя (CACHED_USER_FIELDS) хранится в кэше Django
+    на AUTH_TOKEN_CACHE_TTL секунд, по нему собирается экземпляр User
+    с отложенными остальными полями. По умолчанию это LocMemCache,
+    то есть ограниченный MAX_ENTRIES LRU в памяти процесса; с общим
+    бэкендом (CACHE_BACKEND) записи разделяются между процессами.
+    Записи сбрасываются сигналами при удалении токена (выход через
+    djoser) и при сохранении пользователя (в том числе смене пароля),
+    см. api.signals; удаление пользователя удаляет и его токены.
+    """
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        snapshot = cache.get(cache_key)
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                cache_key,
+                {field: getattr(user, field) for field in CACHED_USER_FIELDS},
+                settings.AUTH_TOKEN_CACHE_TTL
+            )
+            return user, token
+        # from_db ждёт значения в порядке полей модели.
+        names = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in snapshot
+        ]
+        user = User.from_db(
+            User.objects.db, names, [snapshot[name] for name in names])
+        return user, Token(key=key, user=user)
@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Общая версия тел рецептов, см. api.recipe_cache.
+BODIES_VERSION = 'recipe-bodies'
+# Версия счётчиков избранного и корзин: от неё зависят списки,
+# отсортированные по счётчикам.
+COUNTERS_VERSION = 'recipe-counters'
+
+
+def version_key(name):
+    return 'version:{0}'.format(name)
+
+
+def modified_key(name):
+    return 'modified:{0}'.format(name)
+
+
+def recipe_version_name(pk):
+    return 'recipe:{0}'.format(pk)
+
+
+def user_version_name(pk):
+    return 'recipes:user:{0}'.format(pk)
+
+
+def get_versions(names):
+    """Текущие версии данных names для ключей кэша: {name: version}.
+
+    Версии хранятся в общем кэше, поэтому инвалидация видна всем
+    процессам. Если ключ вытеснен, версия начинается заново с текущего
+    времени в миллисекундах и не совпадает ни с одной из прежних.
+    """
+    keys = {name: version_key(name) for name in names}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for name, key in keys.items():
+        if key not in found:
+            now = time.time()
+            cache.add(key, int(now * 1000), None)
+            # Прежнее время изменения неизвестно, берётся текущее.
+            cache.add(modified_key(name), now, None)
+            found[key] = cache.get(key)
+        versions[name] = found[key]
+    return versions
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_versions(names):
+    """Инвалидирует все ключи, построенные на версиях names.
+
+    Версии увеличиваются сразу и ещё раз после коммита транзакции:
+    иначе параллельный запрос, прочитавший данные до коммита, мог бы
+    сохранить их в кэш уже под новой версией.
+    """
+    names = list(names)
+
+    def bump():
+        now = time.time()
+        for name in names:
+            key = version_key(name)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, int(now * 1000), None)
+        cache.set_many({modified_key(name): now for name in names}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def bump_version(name):
+    bump_versions([name])
+
+
+def get_last_modified(names):
+    """Время последнего изменения данных names (timestamp)
+    или None, если оно неизвестно."""
+    found = cache.get_many([modified_key(name) for name in names])
+    if len(found) < len(names):
+        return None
+    return max(found.values())
+
+
+def make_key(prefix, *parts):
+    """Ключ кэша вида prefix:<md5 частей>; части хэшируются,
+    чтобы длина и символы ключа подходили и для memcached."""
+    raw = ':'.join(str(part) for part in parts)
+    return '{0}:{1}'.format(prefix, hashlib.md5(raw.encode()).hexdigest())
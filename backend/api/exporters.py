@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку."""
+    def write(self, value):
+        return value
+
+
+class BaseExporter(ABC):
+    """Базовый экспортёр списка покупок.
+
+    Получает итератор строк из get_shopping_list и лениво отдаёт
+    содержимое файла по частям, не собирая его целиком в памяти.
+    """
+    content_type = None
+    extension = None
+
+    def __init__(self, items):
+        self.items = items
+
+    @property
+    def filename(self):
+        return 'shopping_list.{0}'.format(self.extension)
+
+    @abstractmethod
+    def stream(self):
+        """Итератор частей файла (str или bytes)."""
+
+
+class TextExporter(BaseExporter):
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def stream(self):
+        for item in self.items:
+            yield '{0} ({1}) — {2}\n'.format(
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['total_amount']
+            )
+
+
+class CSVExporter(BaseExporter):
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def stream(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for item in self.items:
+            yield writer.writerow((
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['total_amount']
+            ))
+
+
+class JSONExporter(BaseExporter):
+    content_type = 'application/json'
+    extension = 'json'
+
+    def stream(self):
+        yield '['
+        separator = ''
+        for item in self.items:
+            yield separator + json.dumps({
+                'id': item['ingredient__id'],
+                'name': item['ingredient__name'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'amount': item['total_amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class PDFExporter(BaseExporter):
+    """PDF через reportlab.
+
+    Canvas reportlab держит все страницы в памяти до save(), поэтому
+    PDF, в отличие от остальных форматов, не потоковый: в документ
+    попадает не больше SHOPPING_LIST_PDF_MAX_LINES строк, а вместо
+    остальных - строка с их количеством (полный список - в CSV или
+    TXT). Готовый документ пишется во временный файл, который держится
+    в памяти только до SHOPPING_LIST_SPOOL_SIZE байт, и отдаётся
+    кусками.
+    """
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not font_path or not os.path.exists(font_path):
+            return 'Helvetica'
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def lines(self):
+        limit = settings.SHOPPING_LIST_PDF_MAX_LINES
+        items = iter(self.items)
+        for _, item in zip(range(limit), items):
+            yield '{0} ({1}) — {2}'.format(
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['total_amount']
+            )
+        rest = sum(1 for _ in items)
+        if rest:
+            yield '… и ещё {0}'.format(rest)
+
+    def stream(self):
+        height = A4[1]
+        line_height = self.font_size * 1.5
+        with tempfile.SpooledTemporaryFile(
+            max_size=settings.SHOPPING_LIST_SPOOL_SIZE
+        ) as output:
+            pdf = canvas.Canvas(output, pagesize=A4)
+            font = self.get_font()
+            pdf.setFont(font, self.font_size)
+            y = height - self.margin
+            for line in self.lines():
+                if y < self.margin:
+                    pdf.showPage()
+                    pdf.setFont(font, self.font_size)
+                    y = height - self.margin
+                pdf.drawString(self.margin, y, line)
+                y -= line_height
+            pdf.save()
+            output.seek(0)
+            chunk = output.read(CHUNK_SIZE)
+            while chunk:
+                yield chunk
+                chunk = output.read(CHUNK_SIZE)
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CSVExporter, JSONExporter, PDFExporter)
+}
@@ -0,0 +1,222 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Для обычных авторов лента материализуется при записи: новый рецепт
+фоновым потоком разносится в FeedEntry всех подписчиков пачками по
+FEED_FANOUT_BATCH_SIZE. Рецепты авторов, у которых подписчиков больше
+FEED_FANOUT_THRESHOLD, не разносятся, а подмешиваются при чтении
+отдельным запросом к рецептам. Страницы ленты отдаются keyset-курсором
+по (pub_date, id рецепта).
+
+Подписка дозаполняет ленту последними рецептами автора тем же фоновым
+потоком. Команда prune_feed оставляет каждому пользователю не больше
+FEED_MAX_ENTRIES последних записей.
+"""
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from receipts.models import FeedEntry, Receipt
+from users.models import Subscribe, User
+
+logger = logging.getLogger(__name__)
+
+FAN_OUT_ON_READ_KEY = 'feed:fan-out-on-read'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_fan_out_on_read_authors():
+    """id авторов, чьи рецепты подмешиваются в ленту при чтении.
+
+    Число подписчиков хранит User.followers_count (его поддерживают
+    сигналы подписок), поэтому множество читается по индексу этого
+    поля и кэшируется на FEED_AUTHORS_TTL секунд.
+    """
+    authors = cache.get(FAN_OUT_ON_READ_KEY)
+    if authors is None:
+        authors = frozenset(
+            User.objects
+            .filter(followers_count__gt=settings.FEED_FANOUT_THRESHOLD)
+            .values_list('id', flat=True)
+        )
+        cache.set(FAN_OUT_ON_READ_KEY, authors, settings.FEED_AUTHORS_TTL)
+    return authors
+
+
+def fan_out(pk):
+    """Разносит рецепт в ленты подписчиков автора.
+
+    Подписчики выбираются keyset-пачками по индексу (author, subscriber),
+    каждая пачка вставляется отдельной транзакцией. Возвращает
+    количество обработанных подписчиков.
+    """
+    recipe = Receipt.objects.filter(pk=pk).values(
+        'author_id', 'pub_date').first()
+    if recipe is None:
+        return 0
+    author_id = recipe['author_id']
+    if author_id in get_fan_out_on_read_authors():
+        return 0
+    subscribers = Subscribe.objects.filter(author_id=author_id).order_by(
+        'subscriber_id').values_list('subscriber_id', flat=True)
+    last_id = 0
+    processed = 0
+    while True:
+        batch = list(subscribers.filter(subscriber_id__gt=last_id)[
+            :settings.FEED_FANOUT_BATCH_SIZE])
+        if not batch:
+            return processed
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(
+                    user_id=user_id,
+                    receipt_id=pk,
+                    author_id=author_id,
+                    pub_date=recipe['pub_date']
+                )
+                for user_id in batch
+            ),
+            ignore_conflicts=True
+        )
+        last_id = batch[-1]
+        processed += len(batch)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    if author_id in get_fan_out_on_read_authors():
+        return
+    # Пока задача ждала в очереди, пользователь мог отписаться.
+    if not Subscribe.objects.filter(
+        subscriber_id=user_id, author_id=author_id
+    ).exists():
+        return
+    recipes = Receipt.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')[
+            :settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                receipt_id=pk,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for pk, pub_date in recipes
+        ),
+        ignore_conflicts=True
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает рецепты автора из ленты после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def prune(user_id, keep):
+    """Удаляет из ленты пользователя всё, кроме keep последних
+    записей; возвращает количество удалённых."""
+    entries = FeedEntry.objects.filter(user_id=user_id)
+    last_kept = entries.order_by('-pub_date', '-receipt_id').values_list(
+        'pub_date', 'receipt_id')[keep - 1:keep]
+    if not last_kept:
+        return 0
+    deleted, _ = after_position(
+        entries, last_kept[0], 'receipt_id').delete()
+    return deleted
+
+
+def run_job(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('feed job %s%r failed', function.__name__, args)
+    finally:
+        if settings.FEED_WORKERS:
+            # У потока пула своё соединение с БД.
+            connection.close()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.FEED_WORKERS,
+                thread_name_prefix='recipe-feed'
+            )
+    return _executor
+
+
+def schedule(function, *args):
+    """Ставит задачу ленты в очередь после коммита транзакции."""
+    def submit():
+        if settings.FEED_WORKERS:
+            get_executor().submit(run_job, function, *args)
+        else:
+            run_job(function, *args)
+
+    transaction.on_commit(submit)
+
+
+def schedule_fan_out(pk):
+    schedule(fan_out, pk)
+
+
+def schedule_backfill(user_id, author_id):
+    schedule(backfill, user_id, author_id)
+
+
+def after_position(queryset, position, pk_field):
+    """Keyset-условие: строки строго после (pub_date, id) в порядке
+    убывания. Первое условие даёт индексу начало диапазона."""
+    if position is None:
+        return queryset
+    pub_date, pk = position
+    return queryset.filter(pub_date__lte=pub_date).filter(
+        Q(pub_date__lt=pub_date) | Q(**{pk_field + '__lt': pk})
+    )
+
+
+def get_feed(user, position=None, size=10):
+    """Возвращает id рецептов страницы ленты и позицию следующей
+    страницы (None, если страница последняя).
+
+    Материализованная часть и рецепты авторов с fan-out on read
+    читаются с одной позиции курсора и сливаются по (pub_date, id).
+    """
+    rows = list(
+        after_position(
+            FeedEntry.objects.filter(user=user), position, 'receipt_id')
+        .order_by('-pub_date', '-receipt_id')
+        .values_list('pub_date', 'receipt_id')[:size + 1]
+    )
+    authors = get_fan_out_on_read_authors()
+    if authors:
+        followed = Subscribe.objects.filter(
+            subscriber=user, author_id__in=authors).values('author_id')
+        rows = heapq.merge(
+            rows,
+            after_position(
+                Receipt.objects.filter(author_id__in=followed), position, 'pk')
+            .order_by('-pub_date', '-id')
+            .values_list('pub_date', 'id')[:size + 1],
+            reverse=True
+        )
+    page = []
+    seen = set()
+    for row in rows:
+        # Рецепт может быть и в ленте, и среди fan-out on read, если
+        # автор перешёл порог уже после разноски.
+        if row[1] not in seen:
+            seen.add(row[1])
+            page.append(row)
+    if len(page) > size:
+        return [pk for _, pk in page[:size]], page[size - 1]
+    return [pk for _, pk in page], None
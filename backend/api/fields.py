@@ -1,34 +1,127 @@
 import base64
-import imghdr
+import binascii
+import re
 import uuid
+from tempfile import SpooledTemporaryFile
 
 import six
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
+from PIL import Image
 from rest_framework import serializers
 
+BASE64_MARKER = ';base64,'
+# Клиенты переносят длинный base64 по 76 символов (MIME).
+WHITESPACE = re.compile(r'\s+')
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+DECODE_CHUNK_SIZE = 64 * 1024
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+class ImageTooLarge(ImageDecodeError):
+    pass
 
-class Base64ImageField(serializers.ImageField):
-    """Field for handling image-uploads through raw post data."""
-    def to_internal_value(self, data):
-        if isinstance(data, six.string_types):
-            if 'data:' in data and ';base64,' in data:
-                header, data = data.split(';base64,')
-            try:
-                decoded_file = base64.b64decode(data)
-            except TypeError:
-                self.fail('invalid_image')
-            file_name = str(uuid.uuid4())[:12]
-            file_extension = self.get_file_extension(file_name, decoded_file)
 
-            complete_file_name = "%s.%s" % (file_name, file_extension, )
+def sniff_image_type(head):
+    """Расширение файла по сигнатуре в первых байтах или None."""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
 
-            data = ContentFile(decoded_file, name=complete_file_name)
 
-        return super(Base64ImageField, self).to_internal_value(data)
+def measure_base64(data):
+    """Начало данных base64 в строке и размер после декодирования."""
+    start = data.find(BASE64_MARKER)
+    if start >= 0:
+        start += len(BASE64_MARKER)
+    elif data.startswith('data:'):
+        raise ImageDecodeError('not a base64 data URI')
+    else:
+        start = 0
+    encoded_size = len(data) - start
+    if not encoded_size or encoded_size % 4:
+        raise ImageDecodeError('invalid base64 length')
+    padding = 2 if data.endswith('==') else int(data.endswith('='))
+    return start, encoded_size // 4 * 3 - padding
 
-    def get_file_extension(self, file_name, decoded_file):
 
-        extension = imghdr.what(file_name, decoded_file)
-        extension = "jpg" if extension == "jpeg" else extension
+def decode_base64_image(data, max_size=None, chunk_size=DECODE_CHUNK_SIZE):
+    """Декодирует картинку из base64 (или data URI) в файл.
+
+    Пробелы и переводы строк из данных удаляются. Размер результата
+    проверяется по длине строки до декодирования, затем строка
+    декодируется кусками в SpooledTemporaryFile, который уходит
+    на диск после IMAGE_SPOOL_SIZE байт. Тип картинки определяется
+    по сигнатуре первого куска.
+    """
+    if max_size is None:
+        max_size = settings.MAX_IMAGE_SIZE
+    if WHITESPACE.search(data):
+        data = WHITESPACE.sub('', data)
+    start, size = measure_base64(data)
+    if size > max_size:
+        raise ImageTooLarge(size)
+    file = SpooledTemporaryFile(max_size=settings.IMAGE_SPOOL_SIZE)
+    extension = None
+    try:
+        for offset in range(start, len(data), chunk_size):
+            chunk = base64.b64decode(
+                data[offset:offset + chunk_size], validate=True)
+            if extension is None:
+                extension = sniff_image_type(chunk)
+                if extension is None:
+                    raise ImageDecodeError('unknown image type')
+            file.write(chunk)
+    except (binascii.Error, ImageDecodeError):
+        file.close()
+        raise ImageDecodeError('invalid image data')
+    file.seek(0)
+    result = File(
+        file, name='{0}.{1}'.format(str(uuid.uuid4())[:12], extension))
+    result.size = size
+    return result
+
+
+class Base64ImageField(serializers.ImageField):
+    """Field for handling image-uploads through raw post data."""
+    default_error_messages = {
+        'too_large': 'Image is larger than {max_size} bytes.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, six.string_types):
+            # Файл из multipart: размер известен до чтения содержимого.
+            if getattr(data, 'size', 0) > settings.MAX_IMAGE_SIZE:
+                self.fail('too_large', max_size=settings.MAX_IMAGE_SIZE)
+            return super(Base64ImageField, self).to_internal_value(data)
+        try:
+            image = decode_base64_image(data)
+        except ImageTooLarge:
+            self.fail('too_large', max_size=settings.MAX_IMAGE_SIZE)
+        except ImageDecodeError:
+            self.fail('invalid_image')
+        self.verify_image(image)
+        # Картинка уже проверена по самому файлу; форма Django
+        # прочитала бы его целиком в память, поэтому её валидация
+        # (ImageField.to_internal_value) пропускается.
+        return serializers.FileField.to_internal_value(self, image)
 
-        return extension
+    def verify_image(self, image):
+        try:
+            Image.open(image).verify()
+        except Exception:
+            image.close()
+            self.fail('invalid_image')
+        image.seek(0)
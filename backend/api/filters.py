@@ -1,5 +1,31 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from receipts.models import Receipt
+from django_filters.widgets import QueryArrayWidget
+from receipts.models import AttachedTag, Receipt
+from rest_framework.filters import OrderingFilter
+
+from .reference_cache import tag_cache
+
+TAGS_ANY = 'any'
+TAGS_ALL = 'all'
+
+
+class SlugListField(forms.Field):
+    """Список slug из ?tags=a&tags=b (или ?tags=a,b)."""
+    widget = QueryArrayWidget
+
+    def to_python(self, value):
+        return [
+            slug.strip()
+            for item in value or ()
+            for slug in item.split(',')
+            if slug.strip()
+        ]
+
+
+class SlugListFilter(filters.Filter):
+    field_class = SlugListField
 
 
 class RecipeFilterSet(filters.FilterSet):
@@ -8,25 +34,68 @@ class RecipeFilterSet(filters.FilterSet):
         self.user = request.user
         super().__init__(data, queryset, request=request, prefix=prefix)
 
-    tags = filters.CharFilter(field_name='tags__slug', method='filter_tags')
+    tags = SlugListFilter(method='filter_tags')
+    tags_mode = filters.ChoiceFilter(
+        choices=((TAGS_ANY, TAGS_ANY), (TAGS_ALL, TAGS_ALL)),
+        method='filter_tags_mode'
+    )
     is_favorited = filters.NumberFilter(method='filter_favorite')
     is_in_shopping_cart = filters.NumberFilter(method='filter_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Receipt
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'tags_mode', 'search')
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
 
     def filter_tags(self, queryset, name, value):
-        return queryset.filter(tags__slug=value)
+        """Рецепты с любым (tags_mode=any, по умолчанию) или со всеми
+        (tags_mode=all) тегами из списка.
+
+        Slug переводятся в id по tag_cache, а условие строится через
+        EXISTS по AttachedTag (индекс attached_tag_rev_idx), поэтому
+        строки рецептов не размножаются и distinct() не нужен.
+        """
+        tag_ids = [tag.pk for tag in tag_cache.get_by('slug', value).values()]
+        mode = self.form.cleaned_data.get('tags_mode') or TAGS_ANY
+        if not tag_ids or mode == TAGS_ALL and len(tag_ids) < len(set(value)):
+            return queryset.none()
+        attached = AttachedTag.objects.filter(receipt=OuterRef('pk'))
+        if mode == TAGS_ANY:
+            groups = {'has_tags': tag_ids}
+        else:
+            groups = {
+                'has_tag_{0}'.format(tag_id): [tag_id] for tag_id in tag_ids
+            }
+        return queryset.annotate(**{
+            alias: Exists(attached.filter(tag_id__in=ids))
+            for alias, ids in groups.items()
+        }).filter(**{alias: True for alias in groups})
+
+    def filter_tags_mode(self, queryset, name, value):
+        # Режим применяется в filter_tags.
+        return queryset
 
     def filter_favorite(self, queryset, name, value):
-        if value == 1:
-            return queryset.filter(as_favorite__user=self.user)
-        elif value == 0:
-            return queryset.exclude(as_favorite__user=self.user)
+        return self.filter_user_flag(queryset, 'is_favorited', value)
 
     def filter_shopping_cart(self, queryset, name, value):
-        if value == 1:
-            return queryset.filter(in_shopping_cart__user=self.user)
-        elif value == 0:
-            return queryset.exclude(as_favorite__user=self.user)
+        return self.filter_user_flag(queryset, 'is_in_shopping_cart', value)
+
+    def filter_user_flag(self, queryset, flag, value):
+        if value not in (0, 1):
+            return queryset
+        return queryset.filter_by_user_flag(flag, bool(value), self.user)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка рецептов по ?ordering=. При равных значениях
+    рецепты упорядочиваются по дате, чтобы страницы не пересекались."""
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and 'pub_date' not in ordering[-1]:
+            ordering = list(ordering) + ['-pub_date']
+        return ordering
@@ -0,0 +1,139 @@
+"""Фоновая подготовка уменьшенных копий картинок рецептов.
+
+Оригинал сохраняется в запросе как раньше, а после коммита транзакции
+рецепт ставится в очередь пула потоков. Обработчик строит для каждого
+размера из RECIPE_IMAGE_SIZES копию в каждом из поддерживаемых Pillow
+форматов (WebP, AVIF) и отмечает рецепт флагом image_variants_ready.
+Имена копий выводятся из имени оригинала, поэтому URL строятся без
+обращения к хранилищу. При замене картинки копии прежней удаляются
+после коммита. При IMAGE_WORKERS = 0 обработка идёт синхронно
+после коммита.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+from receipts.models import Receipt
+
+from .caching import bump_versions, recipe_version_name
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'receipts/variants'
+FORMATS = tuple(
+    fmt for fmt in ('webp', 'avif') if features.check(fmt)
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(image_name, size, fmt):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return '{0}/{1}-{2}.{3}'.format(VARIANTS_DIR, stem, size, fmt)
+
+
+def variant_urls(recipe, request=None):
+    """{размер: {формат: URL}} для готовых копий или {}."""
+    if not recipe.image_variants_ready or not recipe.image:
+        return {}
+    urls = {}
+    for size in settings.RECIPE_IMAGE_SIZES:
+        urls[size] = {}
+        for fmt in FORMATS:
+            url = default_storage.url(
+                variant_name(recipe.image.name, size, fmt))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[size][fmt] = url
+    return urls
+
+
+def delete_variants(image_name):
+    for size in settings.RECIPE_IMAGE_SIZES:
+        for fmt in FORMATS:
+            default_storage.delete(variant_name(image_name, size, fmt))
+
+
+def save_variant(image, name, fmt):
+    buffer = BytesIO()
+    image.save(buffer, fmt.upper(), quality=settings.RECIPE_IMAGE_QUALITY)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(pk):
+    """Строит копии картинки рецепта pk; возвращает True,
+    если рецепт отмечен как готовый."""
+    recipe = Receipt.objects.filter(pk=pk).only('pk', 'image').first()
+    if recipe is None or not recipe.image:
+        return False
+    name = recipe.image.name
+    with default_storage.open(name) as file:
+        original = Image.open(file)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert(
+            'RGBA' if 'transparency' in original.info else 'RGB')
+    for size, side in settings.RECIPE_IMAGE_SIZES.items():
+        image = original.copy()
+        image.thumbnail((side, side), Image.LANCZOS)
+        for fmt in FORMATS:
+            save_variant(image, variant_name(name, size, fmt), fmt)
+    # Картинку могли заменить, пока шла обработка.
+    updated = Receipt.objects.filter(pk=pk, image=name).update(
+        image_variants_ready=True)
+    if updated:
+        # Копии попадают и в тело рецепта, и в страницы списка.
+        bump_versions([recipe_version_name(pk), 'recipes'])
+    return bool(updated)
+
+
+def run_job(pk):
+    try:
+        build_variants(pk)
+    except Exception:
+        logger.exception('failed to build image variants for recipe %s', pk)
+    finally:
+        if settings.IMAGE_WORKERS:
+            # У потока пула своё соединение с БД.
+            connection.close()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='recipe-images'
+            )
+    return _executor
+
+
+def replace_variants(pk, old_name):
+    """После коммита удаляет копии прежней картинки рецепта
+    и ставит в очередь построение новых."""
+    transaction.on_commit(partial(delete_variants, old_name))
+    schedule_variants(pk)
+
+
+def schedule_variants(pk):
+    """Ставит рецепт в очередь после коммита текущей транзакции."""
+    def submit():
+        if settings.IMAGE_WORKERS:
+            get_executor().submit(run_job, pk)
+        else:
+            run_job(pk)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,87 @@
+import bisect
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .reference_cache import ingredient_cache
+
+logger = logging.getLogger(__name__)
+
+
+class IngredientIndex:
+    """Префиксный индекс ингредиентов в памяти процесса.
+
+    Хранит отсортированный по имени (в нижнем регистре) массив
+    ингредиентов и ищет по префиксу через bisect, не обращаясь к БД.
+    Индекс строится при старте процесса (warm_up из backend/wsgi.py),
+    а если БД тогда недоступна - при первом обращении. Он помечается
+    устаревшим сигналами post_save/post_delete модели Ingredient и,
+    на случай изменений из других процессов, перестраивается не реже,
+    чем раз в INGREDIENT_INDEX_TTL секунд.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = ([], [])
+        self._built_at = None
+        self._generation = 0
+        self._built_generation = None
+
+    def invalidate(self):
+        self._generation += 1
+
+    def is_stale(self):
+        return (
+            self._built_generation != self._generation
+            or time.monotonic() - self._built_at
+            > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def build(self):
+        generation = self._generation
+        entries = sorted(
+            (
+                ingredient.name.lower(), ingredient.pk, ingredient.name,
+                ingredient.measurement_unit
+            )
+            for ingredient in ingredient_cache.all()
+        )
+        keys = [entry[0] for entry in entries]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in entries
+        ]
+        self._index = (keys, items)
+        self._built_at = time.monotonic()
+        self._built_generation = generation
+
+    def ensure_built(self):
+        if self.is_stale():
+            with self._lock:
+                if self.is_stale():
+                    self.build()
+
+    def search(self, prefix, limit=None):
+        self.ensure_built()
+        keys, items = self._index
+        prefix = prefix.lower()
+        start = bisect.bisect_left(keys, prefix)
+        stop = bisect.bisect_left(keys, prefix + '\U0010ffff', lo=start)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return items[start:stop]
+
+
+ingredient_index = IngredientIndex()
+
+
+def warm_up():
+    """Строит индекс при старте процесса, чтобы первый поиск
+    не загружал таблицу ингредиентов."""
+    try:
+        ingredient_index.ensure_built()
+    except DatabaseError:
+        logger.warning('Ingredient index is not built at startup',
+                       exc_info=True)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from receipts.models import Receipt
+
+from ...images import build_variants
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии картинок рецептов, у которых '
+            'их ещё нет (например, после импорта или смены размеров).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='перестроить копии для всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Receipt.objects.exclude(image='')
+        if not options['all']:
+            queryset = queryset.filter(image_variants_ready=False)
+        built = failed = 0
+        for pk in queryset.values_list('pk', flat=True).iterator():
+            try:
+                build_variants(pk)
+            except Exception as error:
+                failed += 1
+                self.stderr.write('recipe {0}: {1}'.format(pk, error))
+            else:
+                built += 1
+        self.stdout.write(
+            'Built variants for {0} recipes, {1} failed'.format(built, failed))
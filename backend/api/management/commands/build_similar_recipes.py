@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ...similar import build_similar
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты для рецептов, у которых '
+            'изменились ингредиенты или теги (или которые ещё не '
+            'посчитаны).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='пересчитать похожие рецепты для всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        built = build_similar(rebuild_all=options['all'])
+        self.stdout.write(
+            'Updated similar recipes for {0} recipes'.format(built))
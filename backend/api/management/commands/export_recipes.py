@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ...recipe_io import export_recipes
+
+
+class Command(BaseCommand):
+    help = 'Выгружает все рецепты в NDJSON (по рецепту на строку).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            help='файл для выгрузки, по умолчанию stdout'
+        )
+
+    def handle(self, *args, **options):
+        if options['path'] is None:
+            for line in export_recipes():
+                self.stdout.write(line, ending='')
+            return
+        with open(options['path'], 'w', encoding='utf-8') as file:
+            file.writelines(export_recipes())
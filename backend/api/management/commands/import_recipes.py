@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from users.models import User
+
+from ...recipe_io import IMPORT_CHUNK_SIZE, RecipeImporter
+
+
+class Command(BaseCommand):
+    help = 'Импортирует рецепты из файла NDJSON (по рецепту на строку).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--author',
+            help='username автора для строк без поля author'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=IMPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    'Unknown author {0}'.format(options['author']))
+        started = time.perf_counter()
+        with open(options['path'], encoding='utf-8') as file:
+            importer = RecipeImporter(
+                author=author, chunk_size=options['chunk_size']
+            ).run(file)
+        elapsed = time.perf_counter() - started
+        for number, error in importer.errors:
+            self.stderr.write('line {0}: {1}'.format(number, error))
+        self.stdout.write(
+            'Imported {0} recipes, {1} errors in {2:.1f} s'.format(
+                importer.created, len(importer.errors), elapsed
+            )
+        )
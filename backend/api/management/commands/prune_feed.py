@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from receipts.models import FeedEntry
+
+from ...feed import prune
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из лент подписок старые записи сверх '
+            'FEED_MAX_ENTRIES на пользователя.')
+
+    def handle(self, *args, **options):
+        keep = settings.FEED_MAX_ENTRIES
+        users = FeedEntry.objects.values('user').annotate(
+            entries=Count('id')).filter(entries__gt=keep).values_list(
+                'user', flat=True)
+        pruned = sum(prune(user_id, keep) for user_id in users)
+        self.stdout.write('Pruned {0} feed entries'.format(pruned))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from receipts.models import Receipt
+from receipts.signals import COUNTERS
+
+BATCH_SIZE = 1000
+
+
+def actual_count(model):
+    return Coalesce(Subquery(
+        model.objects
+        .filter(receipt=OuterRef('pk'))
+        .order_by()
+        .values('receipt')
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает favorites_count и in_carts_count рецептов '
+            'и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def reconcile(self, last_pk, batch_size):
+        """Сверяет пачку рецептов с id больше last_pk. Строки пачки
+        блокируются, чтобы инкременты из сигналов не потерялись."""
+        fields = list(COUNTERS.values())
+        recipes = list(
+            Receipt.objects
+            .select_for_update()
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', *fields)
+            .annotate(**{
+                'actual_' + field: actual_count(model)
+                for model, field in COUNTERS.items()
+            })[:batch_size]
+        )
+        drifted = []
+        for recipe in recipes:
+            actual = {
+                field: getattr(recipe, 'actual_' + field) for field in fields
+            }
+            if any(getattr(recipe, field) != actual[field]
+                   for field in fields):
+                for field, value in actual.items():
+                    setattr(recipe, field, value)
+                drifted.append(recipe)
+        Receipt.objects.bulk_update(drifted, fields)
+        return recipes, len(drifted)
+
+    def handle(self, *args, **options):
+        last_pk = 0
+        checked = fixed = 0
+        while True:
+            with transaction.atomic():
+                recipes, drifted = self.reconcile(
+                    last_pk, options['batch_size'])
+            if not recipes:
+                break
+            checked += len(recipes)
+            fixed += drifted
+            last_pk = recipes[-1].pk
+        self.stdout.write(
+            'Checked {0} recipes, fixed {1}'.format(checked, fixed))
@@ -0,0 +1,65 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Обёртка для connection.execute_wrapper,
+    считающая количество запросов и время их выполнения."""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def get_query_budget(url_name, method='GET'):
+    """Бюджет ищется по ключу 'METHOD url_name', а для чтения -
+    также просто по url_name."""
+    budgets = settings.QUERY_BUDGETS
+    key = '{0} {1}'.format(method, url_name)
+    if key in budgets:
+        return budgets[key]
+    if method in ('GET', 'HEAD') and url_name in budgets:
+        return budgets[url_name]
+    return settings.QUERY_BUDGET_DEFAULT
+
+
+class QueryCountMiddleware:
+    """Добавляет к ответу заголовки X-DB-Queries и Server-Timing
+    и пишет предупреждение, если эндпоинт превысил бюджет запросов.
+
+    Для StreamingHttpResponse учитываются только запросы,
+    выполненные до начала отдачи тела ответа.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        response['X-DB-Queries'] = counter.count
+        response['Server-Timing'] = 'db;dur={0:.1f};desc="{1} queries"'.format(
+            counter.duration * 1000, counter.count
+        )
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            budget = get_query_budget(match.url_name, request.method)
+            if counter.count > budget:
+                logger.warning(
+                    '%s %s (%s) ran %s queries, budget is %s',
+                    request.method, request.path, match.url_name,
+                    counter.count, budget
+                )
+        return response
@@ -1,5 +1,12 @@
+from abc import ABC, abstractmethod
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from rest_framework import mixins, viewsets
 
+from .caching import get_last_modified, get_versions, make_key
+
 
 class ListCreateRetrieveViewSet(mixins.ListModelMixin,
                                 mixins.RetrieveModelMixin,
@@ -7,3 +14,73 @@ class ListCreateRetrieveViewSet(mixins.ListModelMixin,
                                 viewsets.GenericViewSet):
     """Mixin for UserViewset"""
     pass
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса готовым ответом 304 (или 412)."""
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin(ABC):
+    """Условные GET для list и retrieve.
+
+    ETag строится из URL запроса, формата ответа и версий данных
+    (см. api.caching), которые перечисляет get_version_names(),
+    а Last-Modified - из времени последнего изменения этих версий.
+    На совпадающий If-None-Match или свежий If-Modified-Since ответ 304
+    отдаётся до вызова сериализатора.
+
+    С cache_max_age ответ помечается как public и может кэшироваться
+    nginx; без него - как private с обязательной перепроверкой.
+    """
+    conditional_actions = ('list', 'retrieve')
+    cache_max_age = None
+
+    @abstractmethod
+    def get_version_names(self):
+        """Имена версий данных, от которых зависит ответ."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.last_modified = None
+        if (request.method not in ('GET', 'HEAD')
+                or self.action not in self.conditional_actions):
+            return
+        names = sorted(self.get_version_names())
+        versions = get_versions(names)
+        self.etag = '"{0}"'.format(make_key(
+            'etag',
+            request.build_absolute_uri(),
+            request.accepted_renderer.format,
+            *('{0}={1}'.format(name, versions[name]) for name in names)
+        ))
+        last_modified = get_last_modified(names)
+        if last_modified is not None:
+            self.last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified is not None:
+                response['Last-Modified'] = http_date(self.last_modified)
+            if self.cache_max_age is None:
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ('Authorization', ))
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=self.cache_max_age)
+        return response
@@ -1,4 +1,20 @@
+import base64
+import binascii
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .caching import get_version, make_key, user_version_name
 
 
 class StandardResultsSetPagination(pagination.PageNumberPagination):
@@ -6,3 +22,170 @@ class StandardResultsSetPagination(pagination.PageNumberPagination):
     page_query_param = 'page'
     page_size_query_param = 'limit'
     max_page_size = 1000
+
+
+def estimate_count(model, using):
+    """Оценка числа строк таблицы из статистики PostgreSQL."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+class KnownCountPaginator(Paginator):
+    """Paginator, которому количество объектов передано заранее."""
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+
+    @property
+    def count(self):
+        return self.known_count
+
+
+class CachedCountPagination(StandardResultsSetPagination):
+    """Постраничная выдача с кэшированным количеством объектов.
+
+    COUNT(*) выполняется один раз на набор фильтров и хранится
+    в кэше COUNT_CACHE_TTL секунд. Ключ строится из параметров запроса
+    (без page, limit и ordering) и версии count_cache_name, которую
+    сигналы увеличивают при записи. Если в запросе есть параметры
+    из user_dependent_params, в ключ входят пользователь и его версия
+    user_version_name.
+
+    Для запроса без фильтров на PostgreSQL при оценке из pg_class не
+    меньше COUNT_ESTIMATE_THRESHOLD отдаётся оценка, а в ответе
+    count_approximate становится true.
+    """
+    count_cache_name = None
+    user_dependent_params = ()
+    ignored_params = ('page', 'limit', 'ordering', 'format', 'cursor')
+
+    def get_count_key(self, request, view):
+        name = self.count_cache_name or view.basename
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in self.ignored_params
+        )
+        parts = [name, get_version(name), params]
+        if any(key in self.user_dependent_params for key, _ in params):
+            parts += [
+                request.user.pk,
+                get_version(user_version_name(request.user.pk))
+            ]
+        return make_key('count', *parts)
+
+    def get_count(self, queryset, request, view):
+        self.count_approximate = False
+        if (not queryset.query.where
+                and connections[queryset.db].vendor == 'postgresql'):
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+                self.count_approximate = True
+                return estimate
+        key = self.get_count_key(request, view)
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.COUNT_CACHE_TTL)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.get_page_size(request) is None:
+            return None
+        self.django_paginator_class = partial(
+            KnownCountPaginator,
+            count=self.get_count(queryset, request, view)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_approximate', self.count_approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+def encode_cursor(pub_date, pk):
+    position = '{0}|{1}'.format(pub_date.isoformat(), pk)
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (pub_date, id) из курсора или None,
+    если курсор не удалось разобрать."""
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode()).decode()
+        pub_date, pk = position.split('|')
+        return parse_datetime(pub_date), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+class RecipePagination(CachedCountPagination):
+    """Пагинация ленты рецептов.
+
+    По умолчанию работает как CachedCountPagination (?page=&limit=).
+    С параметром ?cursor= переключается на keyset-пагинацию по
+    (pub_date, id): без COUNT(*) и OFFSET, поэтому время ответа не зависит
+    от глубины страницы. Пустой ?cursor= отдаёт первую страницу, дальше
+    клиент идёт по ссылке next. В этом режиме рецепты всегда упорядочены
+    по (-pub_date, -id).
+    """
+    count_cache_name = 'recipes'
+    user_dependent_params = ('is_favorited', 'is_in_shopping_cart')
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.display_page_controls = False
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None or position[0] is None:
+                raise NotFound(self.invalid_cursor_message)
+            pub_date, pk = position
+            # Условие pub_date <= позиции даёт индексу начало диапазона,
+            # второе отсекает уже отданные рецепты с той же датой.
+            queryset = queryset.filter(pub_date__lte=pub_date).filter(
+                Q(pub_date__lt=pub_date) | Q(pk__lt=pk)
+            )
+        results = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = (results[-1].pub_date, results[-1].pk)
+        return results
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encode_cursor(*self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
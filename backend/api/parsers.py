@@ -0,0 +1,48 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartData(dict):
+    """Поля из JSON-части запроса.
+
+    Request склеивает data и files через copy() и update(); обычный
+    dict.update положил бы из MultiValueDict списки файлов, а не файлы.
+    """
+    def copy(self):
+        return type(self)(self)
+
+    def update(self, other=(), **kwargs):
+        if isinstance(other, MultiValueDict):
+            other = other.dict()
+        super().update(other, **kwargs)
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """multipart/form-data с полями рецепта в JSON-части.
+
+    Картинка приходит файлом и через upload handlers Django пишется
+    во временный файл по частям, без base64. Остальные поля
+    (в том числе вложенные списки тегов и ингредиентов) передаются
+    JSON-строкой в части json_field - обычным полем или файлом.
+    """
+    json_field = 'data'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        raw = result.data.get(self.json_field)
+        if raw is None and self.json_field in result.files:
+            raw = result.files.pop(self.json_field)[0].read()
+        if raw is None:
+            raise ParseError(
+                'Multipart body must contain a "{0}" part.'.format(
+                    self.json_field))
+        try:
+            data = json.loads(raw)
+        except ValueError as error:
+            raise ParseError('JSON parse error - {0}'.format(error))
+        if not isinstance(data, dict):
+            raise ParseError('JSON part must be an object.')
+        return DataAndFiles(MultiPartData(data), result.files)
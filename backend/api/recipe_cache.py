@@ -0,0 +1,127 @@
+"""Двухуровневый кэш ответов с рецептами.
+
+Первый уровень - общие для всех пользователей тела рецептов
+(результат RecipeSerializer без флагов пользователя). Ключ строится
+из id рецепта, версии рецепта и общей версии тел: версию рецепта
+сигналы увеличивают при записи в Receipt, AttachedIngredient
+и AttachedTag, общую - при изменении тегов и ингредиентов. Изменение полей
+автора, которые входят в тело, увеличивает версии только его рецептов.
+
+Второй уровень - множества id избранных рецептов, рецептов в корзине
+и авторов в подписках пользователя. Они хранятся под версией
+пользователя, которую увеличивают его Favorites, ShoppingCart
+и Subscribe. При ответе флаги накладываются на тела из кэша.
+
+Версии и данные хранятся в кэше Django, поэтому подходит любой общий
+бэкенд (Redis, memcached); locmem годится для тестов и одного процесса.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import IntegerField, Value
+from receipts.models import Favorites, Receipt, ShoppingCart
+from users.models import Subscribe
+
+from .caching import (BODIES_VERSION, get_versions, make_key,
+                      recipe_version_name, user_version_name)
+from .serializers import RecipeSerializer
+
+FAVORITE, IN_CART, SUBSCRIBED = range(3)
+NO_FLAGS = (frozenset(), frozenset(), frozenset())
+
+
+def apply_flags(body, flags):
+    """Копия тела рецепта с флагами пользователя."""
+    favorites, cart, subscriptions = flags
+    data = dict(body)
+    data['is_favorited'] = body['id'] in favorites
+    data['is_in_shopping_cart'] = body['id'] in cart
+    data['author'] = dict(
+        body['author'],
+        is_subscribed=body['author']['id'] in subscriptions
+    )
+    return data
+
+
+def load_flags(user):
+    """Множества (избранное, корзина, подписки) одним запросом."""
+    rows = Favorites.objects.filter(user=user).annotate(
+        kind=Value(FAVORITE, IntegerField())
+    ).values_list('receipt_id', 'kind').union(
+        ShoppingCart.objects.filter(user=user).annotate(
+            kind=Value(IN_CART, IntegerField())
+        ).values_list('receipt_id', 'kind'),
+        Subscribe.objects.filter(subscriber=user).annotate(
+            kind=Value(SUBSCRIBED, IntegerField())
+        ).values_list('author_id', 'kind'),
+        all=True
+    )
+    flags = (set(), set(), set())
+    for pk, kind in rows:
+        flags[kind].add(pk)
+    return tuple(frozenset(ids) for ids in flags)
+
+
+class RecipeCache:
+    """Собирает представления рецептов для запроса request."""
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+        # Тело содержит абсолютный URL картинки.
+        self.base_url = request.build_absolute_uri('/')
+
+    def get_body_keys(self, ids):
+        names = [recipe_version_name(pk) for pk in ids]
+        versions = get_versions(names + [BODIES_VERSION])
+        return {
+            pk: make_key('recipe', pk, versions[name],
+                         versions[BODIES_VERSION], self.base_url)
+            for pk, name in zip(ids, names)
+        }
+
+    def get_flags(self):
+        if self.user.is_anonymous:
+            return NO_FLAGS
+        name = user_version_name(self.user.pk)
+        key = make_key('recipe-flags', self.user.pk,
+                       get_versions([name])[name])
+        flags = cache.get(key)
+        if flags is None:
+            flags = load_flags(self.user)
+            cache.set(key, flags, settings.RECIPE_CACHE_TTL)
+        return flags
+
+    def load(self, ids, keys):
+        """Сериализует рецепты ids с флагами из аннотаций
+        и сохраняет в кэш их тела без флагов."""
+        recipes = (
+            Receipt.objects
+            .with_related()
+            .with_user_flags(self.user)
+            .filter(pk__in=ids)
+            .order_by()
+        )
+        data = RecipeSerializer(
+            recipes, many=True, context={'request': self.request}
+        ).data
+        cache.set_many(
+            {keys[item['id']]: apply_flags(item, NO_FLAGS) for item in data},
+            settings.RECIPE_CACHE_TTL
+        )
+        return {item['id']: item for item in data}
+
+    def render(self, ids):
+        """Представления рецептов ids в том же порядке;
+        несуществующие рецепты пропускаются."""
+        keys = self.get_body_keys(ids)
+        found = cache.get_many(keys.values())
+        bodies = {pk: found[key] for pk, key in keys.items() if key in found}
+        missing = [pk for pk in ids if pk not in bodies]
+        fresh = self.load(missing, keys) if missing else {}
+        flags = self.get_flags() if bodies else NO_FLAGS
+        result = []
+        for pk in ids:
+            if pk in fresh:
+                result.append(fresh[pk])
+            elif pk in bodies:
+                result.append(apply_flags(bodies[pk], flags))
+        return result
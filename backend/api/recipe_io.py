@@ -0,0 +1,244 @@
+import json
+import posixpath
+from functools import partial
+
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from receipts.models import (AttachedIngredient, AttachedTag, Ingredient,
+                             Receipt, Tag)
+from rest_framework import serializers
+from users.models import User
+
+from .caching import bump_version
+from .fields import decode_base64_image
+
+EXPORT_CHUNK_SIZE = 500
+IMPORT_CHUNK_SIZE = 500
+IMAGE_ROOT = Receipt._meta.get_field('image').upload_to
+
+
+class IngredientAmountImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=256)
+    measurement_unit = serializers.CharField(max_length=32)
+    amount = serializers.IntegerField(min_value=1, max_value=32767)
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    """Строка NDJSON при импорте рецептов."""
+    name = serializers.CharField(max_length=256)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(min_value=1)
+    image = serializers.CharField()
+    author = serializers.CharField(required=False)
+    tags = serializers.ListField(child=serializers.SlugField(), default=list)
+    ingredients = IngredientAmountImportSerializer(many=True,
+                                                   allow_empty=False)
+
+
+def export_recipes(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Отдаёт рецепты строками NDJSON, загружая их пачками по id."""
+    if queryset is None:
+        queryset = Receipt.objects.all()
+    queryset = queryset.with_related().order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        for recipe in chunk:
+            yield json.dumps({
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': recipe.image.name,
+                'author': recipe.author.username,
+                'pub_date': recipe.pub_date.isoformat(),
+                'tags': [tag.slug for tag in recipe.tags.all()],
+                'ingredients': [
+                    {
+                        'name': item.ingredient.name,
+                        'measurement_unit': item.ingredient.measurement_unit,
+                        'amount': item.amount,
+                    }
+                    for item in recipe.attached_ingredients.all()
+                ],
+            }, ensure_ascii=False) + '\n'
+        last_pk = chunk[-1].pk
+
+
+class RecipeImporter:
+    """Импорт рецептов из NDJSON.
+
+    Теги и ингредиенты ищутся по slug и (name, measurement_unit)
+    в таблицах, загруженных в память один раз. Рецепты вставляются
+    через bulk_create пачками по chunk_size, каждая пачка - в своей
+    транзакции. Ошибки сохраняются построчно и не прерывают импорт.
+
+    Картинки из data URI пишутся в хранилище только после коммита
+    пачки (transaction.on_commit), поэтому откаченная пачка не оставляет
+    файлов. Если файл записать не удалось, рецепт удаляется, а строка
+    попадает в ошибки. Пути к картинкам должны лежать внутри IMAGE_ROOT.
+    """
+    def __init__(self, author=None, chunk_size=IMPORT_CHUNK_SIZE):
+        self.default_author = author
+        self.chunk_size = chunk_size
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.authors = {}
+        self.created = 0
+        self.errors = []
+
+    def get_author(self, username):
+        if username is None:
+            if self.default_author is None:
+                raise serializers.ValidationError(
+                    {'author': ['author is required']})
+            return self.default_author
+        if username not in self.authors:
+            self.authors[username] = User.objects.filter(
+                username=username).first()
+        if self.authors[username] is None:
+            raise serializers.ValidationError(
+                {'author': ['unknown author {0}'.format(username)]})
+        return self.authors[username]
+
+    def get_image(self, image):
+        """Возвращает (имя файла, декодированный файл или None)."""
+        if not image.startswith('data:'):
+            name = posixpath.normpath(image)
+            if (
+                image.startswith('/')
+                or '\\' in image
+                or not name.startswith(IMAGE_ROOT)
+            ):
+                raise serializers.ValidationError({'image': [
+                    'image path must be inside {0}'.format(IMAGE_ROOT)]})
+            return name, None
+        try:
+            file = decode_base64_image(image)
+        except ValueError:
+            raise serializers.ValidationError({'image': ['invalid image']})
+        return IMAGE_ROOT + file.name, file
+
+    def parse(self, line):
+        data = json.loads(line)
+        serializer = RecipeImportSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        errors = {}
+        tag_ids = []
+        for slug in data['tags']:
+            if slug not in self.tags:
+                errors.setdefault('tags', []).append(
+                    'unknown tag {0}'.format(slug))
+            else:
+                tag_ids.append(self.tags[slug])
+        amounts = {}
+        for item in data['ingredients']:
+            key = (item['name'], item['measurement_unit'])
+            if key not in self.ingredients:
+                errors.setdefault('ingredients', []).append(
+                    'unknown ingredient {0} ({1})'.format(*key))
+            else:
+                amounts[self.ingredients[key]] = item['amount']
+        if errors:
+            raise serializers.ValidationError(errors)
+        author = self.get_author(data.get('author'))
+        image, file = self.get_image(data['image'])
+        recipe = Receipt(
+            author=author,
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time'],
+            image=image
+        )
+        return recipe, set(tag_ids), amounts, file
+
+    def insert(self, rows):
+        recipes = [recipe for _, recipe, _, _, _ in rows]
+        if connection.features.can_return_ids_from_bulk_insert:
+            Receipt.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        AttachedTag.objects.bulk_create(
+            AttachedTag(receipt=recipe, tag_id=tag_id)
+            for _, recipe, tag_ids, _, _ in rows
+            for tag_id in tag_ids
+        )
+        AttachedIngredient.objects.bulk_create(
+            AttachedIngredient(
+                receipt=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for _, recipe, _, amounts, _ in rows
+            for ingredient_id, amount in amounts.items()
+        )
+
+    def save_images(self, rows):
+        """Пишет картинки вставленных рецептов после коммита пачки."""
+        for number, recipe, _, _, file in rows:
+            if file is None:
+                continue
+            try:
+                with file:
+                    name = default_storage.save(recipe.image.name, file)
+            except OSError as error:
+                Receipt.objects.filter(pk=recipe.pk).delete()
+                self.created -= 1
+                self.errors.append((number, str(error)))
+                continue
+            if name != recipe.image.name:
+                Receipt.objects.filter(pk=recipe.pk).update(image=name)
+
+    def flush(self, rows):
+        if not rows:
+            return
+        try:
+            with transaction.atomic():
+                self.insert(rows)
+                transaction.on_commit(partial(self.save_images, rows))
+        except DatabaseError:
+            # Пачка не вставилась целиком: повторяем построчно,
+            # чтобы найти и записать в ошибки конкретные строки.
+            for row in rows:
+                row[1].pk = None
+                try:
+                    with transaction.atomic():
+                        self.insert([row])
+                        transaction.on_commit(
+                            partial(self.save_images, [row]))
+                except DatabaseError as error:
+                    self.errors.append((row[0], str(error)))
+                    if row[4] is not None:
+                        row[4].close()
+                else:
+                    self.created += 1
+        else:
+            self.created += len(rows)
+
+    def run(self, lines):
+        rows = []
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                rows.append((number, *self.parse(line)))
+            except serializers.ValidationError as error:
+                self.errors.append((number, error.detail))
+            except ValueError as error:
+                self.errors.append((number, str(error)))
+            if len(rows) >= self.chunk_size:
+                self.flush(rows)
+                rows = []
+        self.flush(rows)
+        # bulk_create не отправляет сигналы, поэтому кэш количества
+        # рецептов сбрасывается явно.
+        bump_version('recipes')
+        return self
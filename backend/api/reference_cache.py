@@ -0,0 +1,93 @@
+import threading
+import time
+
+from django.conf import settings
+from receipts.models import Ingredient, Tag
+
+from .caching import get_version
+
+
+class ReferenceCache:
+    """Справочная таблица (теги, ингредиенты) в памяти процесса.
+
+    Таблица загружается целиком при первом обращении и перезагружается,
+    когда меняется её версия из api.caching (её увеличивают сигналы
+    post_save/post_delete, в том числе из других процессов при общем
+    бэкенде кэша) или проходит REFERENCE_CACHE_TTL секунд.
+    Объекты общие для всех запросов и изменять их нельзя.
+    """
+    def __init__(self, model, version_name):
+        self.model = model
+        self.version_name = version_name
+        self._lock = threading.Lock()
+        self._data = ([], {}, {}, {})
+        self._built_at = None
+        self._built_version = None
+
+    def is_stale(self, version):
+        return (
+            self._built_version != version
+            or time.monotonic() - self._built_at
+            > settings.REFERENCE_CACHE_TTL
+        )
+
+    def ensure_built(self):
+        version = get_version(self.version_name)
+        if self.is_stale(version):
+            with self._lock:
+                if self.is_stale(version):
+                    objects = list(self.model.objects.all())
+                    self._data = (
+                        objects, {obj.pk: obj for obj in objects}, {}, {}
+                    )
+                    self._built_at = time.monotonic()
+                    self._built_version = version
+        return self._data
+
+    def all(self):
+        return self.ensure_built()[0]
+
+    def get(self, pk):
+        return self.get_many([pk]).get(pk)
+
+    def get_many(self, ids):
+        """Объекты по id: {id: объект}; отсутствующих id в ответе нет."""
+        _, by_id, _, _ = self.ensure_built()
+        found = {pk: by_id[pk] for pk in ids if pk in by_id}
+        missing = set(ids) - set(found)
+        if missing:
+            # Объекты могли появиться после загрузки таблицы.
+            found.update(self.model.objects.in_bulk(missing))
+        return found
+
+    def get_by(self, field, values):
+        """Объекты по значениям уникального поля field:
+        {значение: объект}; отсутствующих значений в ответе нет."""
+        objects, _, _, indexes = self.ensure_built()
+        if field not in indexes:
+            indexes[field] = {getattr(obj, field): obj for obj in objects}
+        index = indexes[field]
+        found = {value: index[value] for value in values if value in index}
+        missing = set(values) - set(found)
+        if missing:
+            found.update(
+                (getattr(obj, field), obj)
+                for obj in self.model.objects.filter(
+                    **{field + '__in': missing})
+            )
+        return found
+
+    def serialized(self, serializer_class):
+        """Все объекты, сериализованные serializer_class;
+        результат хранится до перезагрузки таблицы."""
+        objects, _, serialized, _ = self.ensure_built()
+        if serializer_class not in serialized:
+            serialized[serializer_class] = [
+                dict(item)
+                for item in serializer_class(objects, many=True).data
+            ]
+        return serialized[serializer_class]
+
+
+tag_cache = ReferenceCache(Tag, 'tags')
+ingredient_cache = ReferenceCache(Ingredient, 'ingredients')
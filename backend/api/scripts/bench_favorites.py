@@ -0,0 +1,71 @@
+"""Бенчмарк добавления в избранное на большой таблице Favorites.
+
+Запуск: python manage.py runscript bench_favorites \
+    --script-args [количество записей в избранном]
+
+Сравнивает проверку exists() перед созданием с созданием записи,
+которое опирается на уникальное ограничение (user, receipt).
+"""
+from django.db import IntegrityError, connection, transaction
+from receipts.models import Favorites
+from users.models import User
+
+from .benchmark_utils import (create_ingredients, create_recipes,
+                              create_user, measure, rollback)
+
+FAVORITES = 1000000
+RECIPES = 1000
+ATTEMPTS = 1000
+
+
+def check_then_create(user, recipe):
+    if not Favorites.objects.filter(user=user, receipt=recipe).exists():
+        Favorites.objects.create(user=user, receipt=recipe)
+
+
+def create_or_fail(user, recipe):
+    try:
+        with transaction.atomic():
+            Favorites.objects.create(user=user, receipt=recipe)
+    except IntegrityError:
+        pass
+
+
+def run(*args):
+    size = int(args[0]) if args else FAVORITES
+    with rollback():
+        author = create_user('bench_favorites_author')
+        recipes = create_recipes(author, RECIPES, create_ingredients(10),
+                                 ingredients_per_recipe=1)
+        users_count = max(size // len(recipes), 1)
+        User.objects.bulk_create(
+            User(
+                username='bench_fan_{0}'.format(index),
+                email='bench_fan_{0}@bench.local'.format(index)
+            )
+            for index in range(users_count)
+        )
+        users = list(User.objects.filter(username__startswith='bench_fan_'))
+        for user in users:
+            Favorites.objects.bulk_create(
+                Favorites(user=user, receipt=recipe) for recipe in recipes
+            )
+        print('favorites: {0}'.format(Favorites.objects.count()))
+        pairs = [
+            (users[index % len(users)], recipes[index % len(recipes)])
+            for index in range(ATTEMPTS)
+        ]
+        for label, add in (('check then create', check_then_create),
+                           ('create on constraint', create_or_fail)):
+            with measure('{0}, {1} duplicates'.format(label, ATTEMPTS)):
+                for user, recipe in pairs:
+                    add(user, recipe)
+        user, recipe = pairs[0]
+        sql, params = Favorites.objects.filter(
+            user=user, receipt=recipe).query.sql_with_params()
+        explain = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+                   else 'EXPLAIN ')
+        with connection.cursor() as cursor:
+            cursor.execute(explain + sql, params)
+            for row in cursor.fetchall():
+                print(' '.join(str(column) for column in row))
@@ -0,0 +1,121 @@
+"""Бенчмарк ленты подписок на скошенном распределении подписчиков.
+
+Запуск: python manage.py runscript bench_feed \
+    --script-args [читателей] [авторов] [рецептов на автора]
+
+У автора номер k примерно readers / k подписчиков (закон Ципфа),
+поэтому несколько первых авторов популярны, а остальные - нет.
+Первые POWER_READERS читателей подписаны на всех авторов.
+Порог fan-out on read выставляется в четверть читателей. Печатает
+время разноски рецептов по лентам и сравнивает страницу ленты
+с наивным запросом по author__in на читателе с наибольшим числом
+подписок.
+"""
+import random
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.test import override_settings
+from receipts.models import FeedEntry, Receipt
+from users.models import Subscribe, User
+
+from ..feed import FAN_OUT_ON_READ_KEY, fan_out, get_feed
+from .benchmark_utils import (create_ingredients, create_recipes, measure,
+                              rollback)
+
+READERS = 5000
+AUTHORS = 2000
+POWER_READERS = 10
+RECIPES_PER_AUTHOR = 5
+PAGE_SIZE = 10
+
+
+def create_users(prefix, count):
+    User.objects.bulk_create(
+        User(
+            username='{0}{1}'.format(prefix, index),
+            email='{0}{1}@bench.local'.format(prefix, index)
+        )
+        for index in range(count)
+    )
+    return list(User.objects.filter(
+        username__startswith=prefix).values_list('id', flat=True))
+
+
+def subscribe(readers, authors):
+    random.seed(0)
+    power, regular = readers[:POWER_READERS], readers[POWER_READERS:]
+    Subscribe.objects.bulk_create(
+        Subscribe(author_id=author_id, subscriber_id=reader_id)
+        for rank, author_id in enumerate(authors, start=1)
+        for reader_id in power + random.sample(
+            regular, max(1, len(regular) // rank))
+    )
+    # bulk_create не вызывает сигналы, которые ведут счётчик.
+    User.objects.filter(pk__in=authors).update(
+        followers_count=Coalesce(Subquery(
+            Subscribe.objects
+            .filter(author=OuterRef('pk'))
+            .order_by()
+            .values('author')
+            .annotate(count=Count('pk'))
+            .values('count')
+        ), 0))
+
+
+def run(*args):
+    readers_count = int(args[0]) if args else READERS
+    authors_count = int(args[1]) if len(args) > 1 else AUTHORS
+    per_author = int(args[2]) if len(args) > 2 else RECIPES_PER_AUTHOR
+    threshold = readers_count // 4
+    with override_settings(FEED_FANOUT_THRESHOLD=threshold), rollback():
+        cache.delete(FAN_OUT_ON_READ_KEY)
+        readers = create_users('bench_feed_reader', readers_count)
+        authors = create_users('bench_feed_author', authors_count)
+        subscribe(readers, authors)
+        ingredients = create_ingredients(10)
+        recipe_ids = []
+        for author in User.objects.filter(pk__in=authors):
+            recipe_ids += [
+                recipe.pk for recipe in create_recipes(
+                    author, per_author, ingredients,
+                    ingredients_per_recipe=1)
+            ]
+        popular = User.objects.filter(
+            followers_count__gt=threshold).count()
+        print('{0} subscriptions, {1} recipes, {2} authors over {3}'.format(
+            Subscribe.objects.count(), len(recipe_ids), popular, threshold))
+
+        durations = []
+        for pk in recipe_ids:
+            started = time.perf_counter()
+            fan_out(pk)
+            durations.append(time.perf_counter() - started)
+        durations.sort()
+        print('fan-out: {0} entries, {1:.2f} s total, '
+              'p50 {2:.1f} ms, max {3:.1f} ms per recipe'.format(
+                  FeedEntry.objects.count(), sum(durations),
+                  durations[len(durations) // 2] * 1000,
+                  durations[-1] * 1000))
+
+        reader = User.objects.filter(pk__in=readers).annotate(
+            follows=Count('subscribe')).order_by('-follows').first()
+        print('reader follows {0} authors'.format(reader.follows))
+        # Журнал запросов переполнен разноской, а measure считает по нему.
+        connection.queries_log.clear()
+        with measure('naive author__in page'):
+            naive = list(
+                Receipt.objects.filter(
+                    author__in=Subscribe.objects.filter(
+                        subscriber=reader).values('author_id'))
+                .order_by('-pub_date', '-id')
+                .values_list('id', flat=True)[:PAGE_SIZE]
+            )
+        with measure('timeline page 1'):
+            ids, position = get_feed(reader, size=PAGE_SIZE)
+        assert ids == naive, (ids, naive)
+        with measure('timeline page 2'):
+            get_feed(reader, position, size=PAGE_SIZE)
@@ -0,0 +1,54 @@
+"""Бенчмарк декодирования картинок из base64: время и пик памяти.
+
+Запуск: python manage.py runscript bench_image_decode \
+    --script-args [размер картинки в МБ]
+
+Сравнивает прежний способ (split + b64decode + ContentFile и копия
+в BytesIO при валидации) с потоковым decode_base64_image. Память
+считается через tracemalloc сверх уже выделенной строки запроса.
+"""
+import base64
+import io
+import os
+import time
+import tracemalloc
+
+from django.core.files.base import ContentFile
+
+from ..fields import decode_base64_image
+
+SIZE_MB = 5
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+def decode_whole(data):
+    header, encoded = data.split(';base64,')
+    file = ContentFile(base64.b64decode(encoded), name='bench.png')
+    # Так ImageField формы Django читал файл для проверки.
+    return io.BytesIO(file.read())
+
+
+def decode_streaming(data):
+    file = decode_base64_image(data, max_size=len(data))
+    file.close()
+
+
+def measure_decode(label, decode, data):
+    tracemalloc.start()
+    started = time.perf_counter()
+    decode(data)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{0}: {1:.1f} ms, peak {2:.1f} MB'.format(
+        label, elapsed * 1000, peak / 2 ** 20))
+
+
+def run(*args):
+    size = int(float(args[0]) * 2 ** 20) if args else SIZE_MB * 2 ** 20
+    content = PNG_HEADER + os.urandom(size - len(PNG_HEADER))
+    data = 'data:image/png;base64,' + base64.b64encode(content).decode()
+    print('payload: {0:.1f} MB decoded, {1:.1f} MB encoded'.format(
+        size / 2 ** 20, len(data) / 2 ** 20))
+    measure_decode('whole', decode_whole, data)
+    measure_decode('streaming', decode_streaming, data)
@@ -0,0 +1,45 @@
+"""Бенчмарк автодополнения ингредиентов: ILIKE в БД против индекса.
+
+Запуск: python manage.py runscript bench_ingredient_search
+"""
+import csv
+import os
+import time
+
+from django.conf import settings
+from receipts.models import Ingredient
+
+from ..ingredient_index import ingredient_index
+from .benchmark_utils import measure, rollback
+
+DATA_FILE = os.path.join(settings.BASE_DIR, '..', 'data', 'ingredients.csv')
+PREFIXES = ('а', 'аб', 'мол', 'сах', 'кар', 'с', 'п', 'ч', 'ябл', 'x')
+ROUNDS = 100
+
+
+def run():
+    with rollback():
+        with open(DATA_FILE, encoding='utf-8') as file:
+            Ingredient.objects.bulk_create(
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in csv.reader(file)
+            )
+        ingredient_index.invalidate()
+        with measure('index build'):
+            ingredient_index.ensure_built()
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        with measure('{0} database searches'.format(
+                ROUNDS * len(PREFIXES))):
+            for _ in range(ROUNDS):
+                for prefix in PREFIXES:
+                    list(Ingredient.objects.filter(
+                        name__istartswith=prefix
+                    ).values('id', 'name', 'measurement_unit')[:limit])
+        started = time.perf_counter()
+        with measure('{0} index searches'.format(ROUNDS * len(PREFIXES))):
+            for _ in range(ROUNDS):
+                for prefix in PREFIXES:
+                    ingredient_index.search(prefix, limit)
+        elapsed = time.perf_counter() - started
+        print('  {0:.1f} us per index search'.format(
+            elapsed / (ROUNDS * len(PREFIXES)) * 10 ** 6))
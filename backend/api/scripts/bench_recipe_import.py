@@ -0,0 +1,53 @@
+"""Бенчмарк импорта и экспорта рецептов в NDJSON.
+
+Запуск: python manage.py runscript bench_recipe_import \
+    --script-args [количество рецептов]
+"""
+import json
+import time
+
+from ..recipe_io import RecipeImporter, export_recipes
+from .benchmark_utils import (create_ingredients, create_tags, create_user,
+                              rollback)
+
+RECIPES = 10000
+INGREDIENTS_PER_RECIPE = 10
+
+
+def run(*args):
+    size = int(args[0]) if args else RECIPES
+    with rollback():
+        author = create_user('bench_import_author')
+        ingredients = create_ingredients(200)
+        tags = create_tags(5)
+        lines = [
+            json.dumps({
+                'name': 'imported recipe {0}'.format(index),
+                'text': 'text',
+                'cooking_time': 10,
+                'image': 'receipts/bench.png',
+                'tags': [tags[index % len(tags)].slug],
+                'ingredients': [
+                    {
+                        'name': ingredient.name,
+                        'measurement_unit': ingredient.measurement_unit,
+                        'amount': 1,
+                    }
+                    for ingredient in ingredients[
+                        index % 190:index % 190 + INGREDIENTS_PER_RECIPE
+                    ]
+                ],
+            })
+            for index in range(size)
+        ]
+        started = time.perf_counter()
+        importer = RecipeImporter(author=author).run(lines)
+        elapsed = time.perf_counter() - started
+        print('import: {0} recipes, {1} errors, {2:.0f} recipes/s'.format(
+            importer.created, len(importer.errors),
+            importer.created / elapsed))
+        started = time.perf_counter()
+        exported = sum(1 for _ in export_recipes())
+        elapsed = time.perf_counter() - started
+        print('export: {0} recipes, {1:.0f} recipes/s'.format(
+            exported, exported / elapsed))
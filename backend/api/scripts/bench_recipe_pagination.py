@@ -0,0 +1,45 @@
+"""Бенчмарк глубоких страниц ленты рецептов.
+
+Запуск: python manage.py runscript bench_recipe_pagination \
+    --script-args [количество страниц]
+
+Сравнивает ?page=N (OFFSET и COUNT(*)) с ?cursor= (keyset по
+(pub_date, id)) на первой и на последней странице.
+"""
+from rest_framework.test import APIClient
+
+from ..pagination import encode_cursor
+from .benchmark_utils import (create_ingredients, create_recipes,
+                              create_user, measure, rollback)
+
+PAGES = 10000
+PAGE_SIZE = 6
+
+
+def run(*args):
+    pages = int(args[0]) if args else PAGES
+    with rollback():
+        author = create_user('bench_pagination_author')
+        recipes = create_recipes(author, pages * PAGE_SIZE + 1,
+                                 create_ingredients(10),
+                                 ingredients_per_recipe=1)
+        client = APIClient()
+        for page in (1, pages):
+            with measure('page={0}'.format(page)):
+                response = client.get(
+                    '/api/recipes/', {'page': page, 'limit': PAGE_SIZE})
+            assert response.status_code == 200, response.data
+        # Курсор, указывающий на последний рецепт предпоследней страницы.
+        last = sorted(
+            recipes, key=lambda recipe: (recipe.pub_date, recipe.pk),
+            reverse=True
+        )[(pages - 1) * PAGE_SIZE - 1]
+        for label, cursor in (
+            ('cursor, page 1', ''),
+            ('cursor, page {0}'.format(pages),
+             encode_cursor(last.pub_date, last.pk)),
+        ):
+            with measure(label):
+                response = client.get(
+                    '/api/recipes/', {'cursor': cursor, 'limit': PAGE_SIZE})
+            assert len(response.data['results']) == PAGE_SIZE
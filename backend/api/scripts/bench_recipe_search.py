@@ -0,0 +1,60 @@
+"""Бенчмарк поиска рецептов на сгенерированном корпусе.
+
+Запуск: python manage.py runscript bench_recipe_search \
+    --script-args [количество рецептов]
+
+На PostgreSQL печатает EXPLAIN ANALYZE, в котором должны быть видны
+Bitmap Index Scan по receipts_receipt_search_vector
+и receipts_receipt_name_trgm.
+"""
+import random
+
+from django.db import connection
+from receipts.models import Receipt
+
+from .benchmark_utils import create_user, measure, rollback
+
+CORPUS_SIZE = 100000
+BATCH_SIZE = 5000
+WORDS = (
+    'борщ', 'суп', 'салат', 'пирог', 'блины', 'каша', 'котлеты', 'плов',
+    'капуста', 'свёкла', 'морковь', 'картофель', 'говядина', 'курица',
+    'рыба', 'грибы', 'сыр', 'яйца', 'мука', 'молоко', 'сметана', 'укроп',
+    'чеснок', 'лук', 'томаты', 'перец', 'рис', 'гречка', 'яблоки', 'мёд',
+)
+QUERIES = ('борщ', 'капуста', 'грибы сметана', 'пирог яблоки', 'котлеты')
+
+
+def generate_text(rnd, size):
+    return ' '.join(rnd.choice(WORDS) for _ in range(size))
+
+
+def run(*args):
+    size = int(args[0]) if args else CORPUS_SIZE
+    rnd = random.Random(0)
+    with rollback():
+        author = create_user('bench_search_author')
+        for start in range(0, size, BATCH_SIZE):
+            Receipt.objects.bulk_create(
+                Receipt(
+                    author=author,
+                    name=generate_text(rnd, 2),
+                    text=generate_text(rnd, 30),
+                    image='receipts/bench.png',
+                    cooking_time=10
+                )
+                for _ in range(start, min(start + BATCH_SIZE, size))
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE receipts_receipt')
+        print('corpus of {0} recipes on {1}'.format(size, connection.vendor))
+        for query in QUERIES:
+            queryset = Receipt.objects.search(query)[:6]
+            with measure('search {0!r}'.format(query)):
+                list(queryset)
+        if connection.vendor == 'postgresql':
+            print(Receipt.objects.search(QUERIES[0])[:6].explain(
+                analyze=True))
+        else:
+            print(Receipt.objects.search(QUERIES[0])[:6].explain())
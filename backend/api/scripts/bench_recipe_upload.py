@@ -0,0 +1,95 @@
+"""Бенчмарк загрузки картинки рецепта: base64 в JSON и multipart.
+
+Запуск: python manage.py runscript bench_recipe_upload \
+    --script-args [размер картинки в МБ] [повторы]
+
+Пик памяти считается через tracemalloc за весь запрос, включая тело,
+которое тестовый клиент собирает в памяти, поэтому разница между
+способами - это копии картинки на стороне сервера.
+"""
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .benchmark_utils import create_user, rollback
+
+SIZE_MB = 4
+REPEAT = 5
+RECIPE = {
+    'name': 'bench recipe',
+    'text': 'text',
+    'cooking_time': 10,
+    'tags': [],
+    'ingredients': [],
+}
+
+
+def make_png(size):
+    # Шум почти не сжимается: размер PNG близок к size байт.
+    side = int((size / 3) ** 0.5)
+    buffer = BytesIO()
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+        buffer, 'PNG', compress_level=0)
+    return buffer.getvalue()
+
+
+def post_base64(client, content):
+    return client.post('/api/recipes/', dict(
+        RECIPE,
+        image='data:image/png;base64,' + base64.b64encode(content).decode()
+    ), format='json')
+
+
+def post_multipart(client, content):
+    return client.post('/api/recipes/', {
+        'data': json.dumps(RECIPE),
+        'image': SimpleUploadedFile('bench.png', content),
+    }, format='multipart')
+
+
+def measure_upload(label, post, client, content, repeat):
+    elapsed = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = post(client, content)
+        elapsed.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert response.status_code == 201, response.data
+    print('{0}: {1:.1f} ms, peak {2:.1f} MB'.format(
+        label, min(elapsed) * 1000, peak / 2 ** 20))
+
+
+def run(*args):
+    size = int(float(args[0]) * 2 ** 20) if args else SIZE_MB * 2 ** 20
+    repeat = int(args[1]) if len(args) > 1 else REPEAT
+    content = make_png(size)
+    print('image: {0:.1f} MB'.format(len(content) / 2 ** 20))
+    media_root = tempfile.mkdtemp()
+    try:
+        with override_settings(
+            MEDIA_ROOT=media_root,
+            ALLOWED_HOSTS=['*'],
+            MAX_IMAGE_SIZE=len(content),
+            DATA_UPLOAD_MAX_MEMORY_SIZE=None,
+        ), rollback():
+            client = APIClient()
+            client.force_authenticate(create_user('bench_upload_author'))
+            measure_upload('base64 json', post_base64, client, content,
+                           repeat)
+            measure_upload('multipart', post_multipart, client, content,
+                           repeat)
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
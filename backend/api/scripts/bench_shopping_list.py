@@ -0,0 +1,38 @@
+"""Бенчмарк сборки списка покупок.
+
+Запуск: python manage.py runscript bench_shopping_list
+"""
+import tracemalloc
+
+from receipts.models import ShoppingCart
+
+from ..exporters import EXPORTERS
+from ..services import get_shopping_list
+from .benchmark_utils import (create_ingredients, create_recipes,
+                              create_user, measure, rollback)
+
+CART_SIZES = (5, 50, 500)
+
+
+def run():
+    with rollback():
+        author = create_user('bench_author')
+        ingredients = create_ingredients(200)
+        recipes = create_recipes(author, max(CART_SIZES), ingredients)
+        for size in CART_SIZES:
+            user = create_user('bench_user_{0}'.format(size))
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=user, receipt=recipe)
+                for recipe in recipes[:size]
+            )
+            with measure('cart of {0} recipes'.format(size)):
+                rows = list(get_shopping_list(user))
+            print('  {0} shopping list rows'.format(len(rows)))
+        for export_format, exporter_class in EXPORTERS.items():
+            exporter = exporter_class(get_shopping_list(user).iterator())
+            tracemalloc.start()
+            size = sum(len(chunk) for chunk in exporter.stream())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('{0} export: {1} bytes, peak memory {2} KiB'.format(
+                export_format, size, peak // 1024))
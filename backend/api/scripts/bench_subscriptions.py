@@ -0,0 +1,44 @@
+"""Бенчмарк ленты подписок.
+
+Запуск: python manage.py runscript bench_subscriptions
+"""
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+from .benchmark_utils import (create_ingredients, create_recipes,
+                              create_user, measure, rollback)
+
+FOLLOW_COUNTS = (10, 100, 1000)
+RECIPES_PER_AUTHOR = 5
+
+
+def run():
+    with rollback():
+        ingredients = create_ingredients(10)
+        User.objects.bulk_create(
+            User(
+                username='bench_author_{0}'.format(index),
+                email='bench_author_{0}@bench.local'.format(index)
+            )
+            for index in range(max(FOLLOW_COUNTS))
+        )
+        authors = list(
+            User.objects.filter(username__startswith='bench_author_')
+        )
+        for author in authors:
+            create_recipes(author, RECIPES_PER_AUTHOR, ingredients,
+                           ingredients_per_recipe=1)
+        client = APIClient()
+        for count in FOLLOW_COUNTS:
+            user = create_user('bench_follower_{0}'.format(count))
+            Subscribe.objects.bulk_create(
+                Subscribe(author=author, subscriber=user)
+                for author in authors[:count]
+            )
+            client.force_authenticate(user)
+            with measure('following {0} authors'.format(count)):
+                response = client.get(
+                    '/api/users/subscriptions/',
+                    {'limit': 6, 'recipes_limit': 3}
+                )
+            assert response.status_code == 200, response.data
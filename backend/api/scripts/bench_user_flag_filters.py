@@ -0,0 +1,75 @@
+"""Бенчмарк фильтров is_favorited и is_in_shopping_cart.
+
+Запуск: python manage.py runscript bench_user_flag_filters \
+    --script-args [рецептов в избранном] [всего рецептов]
+
+Пользователь добавляет в избранное и в корзину заданное количество
+рецептов. Сравнивает прежние фильтры через обратные join
+(as_favorite__user) с EXISTS из filter_by_user_flag на странице
+списка и на COUNT(*), а затем прогоняет запрос списка через API.
+"""
+from receipts.models import Favorites, Receipt, ShoppingCart
+from rest_framework.test import APIClient
+
+from .benchmark_utils import (create_ingredients, create_recipes,
+                              create_user, measure, rollback)
+
+FAVORITES = 10000
+RECIPES = 20000
+PAGE_SIZE = 6
+
+
+def join_filters(user):
+    return (
+        ('join is_favorited=1',
+         Receipt.objects.filter(as_favorite__user=user)),
+        ('join is_favorited=0',
+         Receipt.objects.exclude(as_favorite__user=user)),
+        ('join is_in_shopping_cart=1',
+         Receipt.objects.filter(in_shopping_cart__user=user)),
+    )
+
+
+def exists_filters(user):
+    return tuple(
+        ('exists {0}={1:d}'.format(flag, value),
+         Receipt.objects.filter_by_user_flag(flag, value, user))
+        for flag, value in (
+            ('is_favorited', True),
+            ('is_favorited', False),
+            ('is_in_shopping_cart', True),
+        )
+    )
+
+
+def run(*args):
+    favorites = int(args[0]) if args else FAVORITES
+    total = int(args[1]) if len(args) > 1 else max(RECIPES, favorites)
+    with rollback():
+        user = create_user('bench_flags_user')
+        recipes = create_recipes(
+            create_user('bench_flags_author'), total,
+            create_ingredients(10), ingredients_per_recipe=1)
+        Favorites.objects.bulk_create(
+            Favorites(user=user, receipt=recipe)
+            for recipe in recipes[:favorites]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, receipt=recipe)
+            for recipe in recipes[:favorites]
+        )
+        print('{0} recipes, {1} favorites and cart items'.format(
+            total, favorites))
+        for label, queryset in join_filters(user) + exists_filters(user):
+            queryset = queryset.only('id', 'pub_date').order_by(
+                '-pub_date', '-id')
+            with measure(label + ', page'):
+                list(queryset[:PAGE_SIZE])
+            with measure(label + ', count'):
+                queryset.count()
+        client = APIClient()
+        client.force_authenticate(user)
+        for params in ({'is_favorited': 1}, {'is_in_shopping_cart': 0}):
+            with measure('GET /api/recipes/ {0}'.format(params)):
+                response = client.get('/api/recipes/', params)
+            assert response.status_code == 200, response.data
@@ -0,0 +1,101 @@
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from receipts.models import (AttachedIngredient, AttachedTag, Ingredient,
+                             Receipt, Tag)
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback():
+    """Выполняет бенчмарк в транзакции и откатывает все созданные данные."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@contextmanager
+def measure(label):
+    """Печатает время выполнения блока и количество SQL-запросов."""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        yield queries
+        elapsed = time.perf_counter() - started
+    print('{0}: {1:.1f} ms, {2} queries'.format(
+        label, elapsed * 1000, len(queries)))
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email='{0}@bench.local'.format(username),
+        password='benchmark'
+    )
+
+
+def create_ingredients(count, prefix='bench ingredient'):
+    Ingredient.objects.bulk_create(
+        Ingredient(
+            name='{0} {1}'.format(prefix, index),
+            measurement_unit='g'
+        )
+        for index in range(count)
+    )
+    return list(Ingredient.objects.filter(name__startswith=prefix))
+
+
+def create_tags(count, prefix='bench'):
+    start = Tag.objects.count()
+    Tag.objects.bulk_create(
+        Tag(
+            name='{0} tag {1}'.format(prefix, index),
+            color='#{0:06X}'.format(start + index),
+            slug='{0}-{1}'.format(prefix, index)
+        )
+        for index in range(count)
+    )
+    return list(Tag.objects.filter(slug__startswith=prefix))
+
+
+def create_recipes(author, count, ingredients, tags=(),
+                   ingredients_per_recipe=10, tags_per_recipe=2):
+    """Создаёт рецепты пачками вместе с ингредиентами и тегами."""
+    Receipt.objects.bulk_create(
+        Receipt(
+            author=author,
+            name='bench recipe {0}'.format(index),
+            text='benchmark recipe text {0}'.format(index),
+            image='receipts/bench.png',
+            cooking_time=10
+        )
+        for index in range(count)
+    )
+    recipes = list(
+        Receipt.objects.filter(author=author).order_by('-id')[:count]
+    )
+    attached_ingredients = []
+    attached_tags = []
+    for index, recipe in enumerate(recipes):
+        for offset in range(min(ingredients_per_recipe, len(ingredients))):
+            attached_ingredients.append(AttachedIngredient(
+                receipt=recipe,
+                ingredient=ingredients[(index + offset) % len(ingredients)],
+                amount=offset + 1
+            ))
+        for offset in range(min(tags_per_recipe, len(tags))):
+            attached_tags.append(AttachedTag(
+                receipt=recipe,
+                tag=tags[(index + offset) % len(tags)]
+            ))
+    AttachedIngredient.objects.bulk_create(attached_ingredients)
+    AttachedTag.objects.bulk_create(attached_tags)
+    return recipes
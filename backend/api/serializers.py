@@ -1,4 +1,6 @@
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from receipts.models import (AttachedIngredient, AttachedTag, Favorites,
                              Ingredient, Receipt, ShoppingCart, Tag)
 from rest_framework import serializers
@@ -7,6 +9,8 @@ from rest_framework.validators import UniqueValidator
 from users.models import Subscribe, User
 
 from .fields import Base64ImageField
+from .images import schedule_variants, variant_urls
+from .reference_cache import ingredient_cache, tag_cache
 
 
 class SignupSerializer(serializers.ModelSerializer):
@@ -55,6 +59,8 @@ class UserManageSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         """Метод, определяющий,
         является ли текущий пользователь подписанным или нет."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return not user.is_anonymous and Subscribe.objects.filter(
             author=obj, subscriber=user).exists()
@@ -67,9 +73,9 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # Ингредиенты по id разрешаются разом
+    # в RecipeSerializer.validate_ingredients.
+    id = serializers.IntegerField()
     measurement_unit = serializers.StringRelatedField(
         source='ingredient.measurement_unit', read_only=True
     )
@@ -112,6 +118,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     author = UserManageSerializer(read_only=True)
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Receipt
@@ -119,6 +126,7 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'author',
                   'name',
                   'image',
+                  'images',
                   'text',
                   'ingredients',
                   'tags',
@@ -129,44 +137,84 @@ class RecipeSerializer(serializers.ModelSerializer):
     def to_internal_value(self, data):
         tags_id = data.get('tags')
         internal_data = super().to_internal_value(data)
+        if not isinstance(tags_id, list):
+            raise ValidationError(
+                {'tags': ['invalid tags id']},
+                code='invalid'
+            )
         try:
-            tags = Tag.objects.filter(id__in=tags_id)
-        except Tag.DoesNotExist:
+            tags_id = {int(tag_id) for tag_id in tags_id}
+        except (TypeError, ValueError):
             raise ValidationError(
                 {'tags': ['invalid tags id']},
                 code='invalid'
             )
-        internal_data['tags'] = tags
+        tags = tag_cache.get_many(tags_id)
+        if len(tags) != len(tags_id):
+            raise ValidationError(
+                {'tags': ['invalid tags id']},
+                code='invalid'
+            )
+        internal_data['tags'] = list(tags.values())
         return internal_data
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
+    def get_images(self, obj):
+        return variant_urls(obj, self.context.get('request'))
+
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return not user.is_anonymous and ShoppingCart.objects.filter(
             receipt=obj, user=user).exists()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return not user.is_anonymous and Favorites.objects.filter(
             receipt=obj, user=user).exists()
 
+    def validate_ingredients(self, value):
+        ingredient_ids = [item['id'] for item in value]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise ValidationError('ingredients must be unique')
+        ingredients = ingredient_cache.get_many(ingredient_ids)
+        unknown = [pk for pk in ingredient_ids if pk not in ingredients]
+        if unknown:
+            raise ValidationError(
+                'invalid ingredients id: {0}'.format(unknown))
+        for item in value:
+            item['id'] = ingredients[item['id']]
+        return value
+
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('attached_ingredients')
         user = self.context['request'].user
         recipe = Receipt(author=user, **validated_data)
         recipe.save()
-        for tag_data in tags_data:
-            recipe.tags.add(tag_data)
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data.pop('id')
-            amount = ingredient_data.pop('amount')
-            AttachedIngredient.objects.create(
+        AttachedTag.objects.bulk_create(
+            AttachedTag(receipt=recipe, tag=tag) for tag in tags_data
+        )
+        AttachedIngredient.objects.bulk_create(
+            AttachedIngredient(
                 receipt=recipe,
-                ingredient=ingredient,
-                amount=amount
+                ingredient=ingredient_data['id'],
+                amount=ingredient_data['amount']
             )
+            for ingredient_data in ingredients_data
+        )
+        schedule_variants(recipe.pk)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('attached_ingredients')
@@ -179,29 +227,104 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
         for attr, value in validated_data.items():
             setattr(recipe, attr, value)
-        AttachedTag.objects.filter(receipt=recipe).delete()
-        for tag_data in tags_data:
-            recipe.tags.add(tag_data)
-        AttachedIngredient.objects.filter(receipt=recipe).delete()
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data.pop('id')
-            amount = ingredient_data.pop('amount')
-            AttachedIngredient.objects.create(
-                receipt=recipe,
-                ingredient=ingredient,
-                amount=amount
-            )
-        recipe.save()
+        # Пишутся только изменённые поля: счётчики и флаги фоновых
+        # задач могли поменяться другими запросами. Флаг копий при
+        # замене картинки сбрасывает Receipt.save, а новые копии
+        # ставит в очередь сигнал post_save.
+        update_fields = list(validated_data)
+        # Теги и ингредиенты могли измениться: соседей пересчитает
+        # build_similar_recipes. Версия не даёт идущему пересчёту
+        # отметить рецепт готовым по устаревшим векторам.
+        recipe.similar_ready = False
+        recipe.similar_version = F('similar_version') + 1
+        update_fields += ['similar_ready', 'similar_version']
+        self.update_tags(recipe, tags_data)
+        self.update_ingredients(recipe, ingredients_data)
+        recipe.save(update_fields=update_fields)
         return recipe
 
+    def update_tags(self, recipe, tags_data):
+        """Удаляет снятые теги и добавляет новые, не трогая остальные."""
+        new_ids = {tag.id for tag in tags_data}
+        old_ids = set(
+            AttachedTag.objects.filter(receipt=recipe)
+            .values_list('tag_id', flat=True)
+        )
+        if old_ids - new_ids:
+            AttachedTag.objects.filter(
+                receipt=recipe, tag_id__in=old_ids - new_ids
+            ).delete()
+        AttachedTag.objects.bulk_create(
+            AttachedTag(receipt=recipe, tag_id=tag_id)
+            for tag_id in new_ids - old_ids
+        )
+
+    def update_ingredients(self, recipe, ingredients_data):
+        """Применяет к ингредиентам рецепта только фактические изменения:
+        удаляет убранные, обновляет изменившиеся количества
+        и добавляет новые."""
+        new_amounts = {
+            ingredient_data['id'].id: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        attached = {
+            attached_ingredient.ingredient_id: attached_ingredient
+            for attached_ingredient in
+            AttachedIngredient.objects.filter(receipt=recipe)
+        }
+        removed = [
+            attached_ingredient.id
+            for ingredient_id, attached_ingredient in attached.items()
+            if ingredient_id not in new_amounts
+        ]
+        if removed:
+            AttachedIngredient.objects.filter(id__in=removed).delete()
+        changed = []
+        for ingredient_id, attached_ingredient in attached.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and attached_ingredient.amount != amount:
+                attached_ingredient.amount = amount
+                changed.append(attached_ingredient)
+        AttachedIngredient.objects.bulk_update(changed, ('amount', ))
+        AttachedIngredient.objects.bulk_create(
+            AttachedIngredient(
+                receipt=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in attached
+        )
+
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    """Превью рецепта: картинка - самая маленькая копия, если готова."""
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Receipt
         fields = ('id', 'name', 'image', 'cooking_time')
 
+    def get_image(self, obj):
+        request = self.context.get('request')
+        sizes = settings.RECIPE_IMAGE_SIZES
+        variants = variant_urls(obj, request).get(min(sizes, key=sizes.get))
+        if variants:
+            return next(iter(variants.values()))
+        if not obj.image:
+            return None
+        if request is None:
+            return obj.image.url
+        return request.build_absolute_uri(obj.image.url)
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(
+        min_value=1,
+        default=settings.SUBSCRIPTION_RECIPES_LIMIT
+    )
+
+    def validate_recipes_limit(self, value):
+        return min(value, settings.SUBSCRIPTION_RECIPES_LIMIT_MAX)
+
 
 class SubscribeUserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -221,17 +344,22 @@ class SubscribeUserSerializer(serializers.ModelSerializer):
                   )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Receipt.objects.filter(author=obj).count()
 
     def get_recipes(self, obj):
-        page_size = (self.context['request'].query_params.get('recipes_limit')
-                     or 10)
-        paginator = Paginator(obj.receipts.all(), page_size)
-        recipes = paginator.page(1)
-        serializer = ShortRecipeSerializer(recipes, many=True)
+        if hasattr(obj, 'recipe_previews'):
+            recipes = obj.recipe_previews
+        else:
+            recipes = obj.receipts.all()[:self.context['recipes_limit']]
+        serializer = ShortRecipeSerializer(
+            recipes, many=True, context=self.context)
         return serializer.data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return Subscribe.objects.filter(
             author=obj, subscriber=user).exists()
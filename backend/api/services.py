@@ -0,0 +1,86 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import (BooleanField, Count, IntegerField, OuterRef,
+                              Prefetch, Subquery, Sum, Value)
+from django.db.models.functions import Coalesce
+from receipts.models import AttachedIngredient, Ingredient, Receipt
+from users.models import Subscribe, User
+
+
+def get_shopping_list(user):
+    """Собирает список покупок пользователя одним сгруппированным запросом.
+
+    Ингредиенты группируются по (id, name, measurement_unit), поэтому
+    одинаковые названия с разными единицами измерения не складываются.
+    """
+    return (
+        AttachedIngredient.objects
+        .filter(receipt__in_shopping_cart__user=user)
+        .values(
+            'ingredient__id',
+            'ingredient__name',
+            'ingredient__measurement_unit'
+        )
+        .annotate(total_amount=Sum('amount'))
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def with_recipe_previews(authors, recipes_limit):
+    """Аннотирует авторов количеством рецептов и подгружает
+    не более recipes_limit последних рецептов каждого автора.
+
+    Количество считается коррелированным подзапросом, поэтому
+    вычисляется только для авторов на текущей странице, а превью
+    всех авторов страницы загружаются одним запросом.
+    """
+    recipes_count = (
+        Receipt.objects
+        .filter(author=OuterRef('pk'))
+        .order_by()
+        .values('author')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    latest_recipes = (
+        Receipt.objects
+        .filter(author=OuterRef('author'))
+        .values('pk')[:recipes_limit]
+    )
+    return authors.annotate(
+        recipes_count=Coalesce(
+            Subquery(recipes_count, output_field=IntegerField()), 0
+        ),
+        is_subscribed=Value(True, output_field=BooleanField())
+    ).prefetch_related(
+        Prefetch(
+            'receipts',
+            queryset=Receipt.objects.filter(pk__in=Subquery(latest_recipes)),
+            to_attr='recipe_previews'
+        )
+    )
+
+
+def get_subscriptions(user, recipes_limit):
+    """Авторы, на которых подписан пользователь, с превью рецептов."""
+    authors = User.objects.filter(
+        pk__in=Subscribe.objects.filter(subscriber=user).values('author')
+    ).order_by('id')
+    return with_recipe_previews(authors, recipes_limit)
+
+
+def fuzzy_search_ingredients(name, limit):
+    """Нечёткий поиск ингредиентов по триграммам (только PostgreSQL).
+
+    Используется, когда префиксный поиск ничего не нашёл, например
+    при опечатке в названии.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    return list(
+        Ingredient.objects
+        .filter(name__trigram_similar=name)
+        .annotate(similarity=TrigramSimilarity('name', name))
+        .order_by('-similarity')
+        .values('id', 'name', 'measurement_unit')[:limit]
+    )
@@ -0,0 +1,117 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from receipts.models import (AttachedIngredient, AttachedTag, Favorites,
+                             Ingredient, Receipt, ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from users.models import Subscribe, User
+
+from .authentication import invalidate_keys, invalidate_tokens, token_cache_key
+from .caching import (BODIES_VERSION, COUNTERS_VERSION, bump_version,
+                      bump_versions, recipe_version_name, user_version_name)
+from .feed import remove_author, schedule_backfill, schedule_fan_out
+from .images import replace_variants
+from .ingredient_index import ingredient_index
+from .serializers import UserManageSerializer
+
+# Поля автора, которые входят в тело рецепта.
+AUTHOR_FIELDS = tuple(
+    field for field in UserManageSerializer.Meta.fields
+    if field not in ('id', 'is_subscribed')
+)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Receipt)
+def invalidate_recipe(sender, instance, **kwargs):
+    bump_version(recipe_version_name(instance.pk))
+    bump_version('recipes')
+
+
+@receiver(post_save, sender=Receipt)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance.pk)
+
+
+@receiver(post_save, sender=Receipt)
+def rebuild_image_variants(sender, instance, **kwargs):
+    if getattr(instance, 'replaced_image', None):
+        replace_variants(instance.pk, instance.replaced_image)
+
+
+@receiver(post_save, sender=Subscribe)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        schedule_backfill(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def remove_author_from_feed(sender, instance, **kwargs):
+    remove_author(instance.subscriber_id, instance.author_id)
+
+
+@receiver((post_save, post_delete), sender=AttachedIngredient)
+@receiver((post_save, post_delete), sender=AttachedTag)
+def invalidate_recipe_parts(sender, instance, **kwargs):
+    bump_version(recipe_version_name(instance.receipt_id))
+    bump_version('recipes')
+
+
+@receiver((post_save, post_delete), sender=Favorites)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_user_recipes(sender, instance, **kwargs):
+    bump_versions([user_version_name(instance.user_id), COUNTERS_VERSION])
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_user_subscriptions(sender, instance, **kwargs):
+    bump_version(user_version_name(instance.subscriber_id))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_reference_data(sender, **kwargs):
+    bump_version(BODIES_VERSION)
+    bump_version('ingredients' if sender is Ingredient else 'tags')
+
+
+@receiver(pre_save, sender=User)
+def invalidate_author_bodies(sender, instance, update_fields=None,
+                             **kwargs):
+    """Инвалидирует рецепты автора, если меняются поля, которые
+    показываются в теле рецепта. Смена пароля, вход и сохранение
+    других полей тела рецептов не трогают."""
+    if instance._state.adding or instance.pk is None:
+        return
+    fields = AUTHOR_FIELDS
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+        if not fields:
+            return
+    old = User.objects.filter(pk=instance.pk).values(*fields).first()
+    if old is None or all(
+        old[field] == getattr(instance, field) for field in fields
+    ):
+        return
+    bump_versions([
+        recipe_version_name(pk) for pk in
+        Receipt.objects.filter(author=instance).values_list('pk', flat=True)
+    ] + ['recipes'])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields=None,
+                           **kwargs):
+    if created:
+        return
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        invalidate_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_keys([token_cache_key(instance.key)])
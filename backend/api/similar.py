@@ -0,0 +1,140 @@
+"""Похожие рецепты по ингредиентам и тегам.
+
+Индекс строится офлайн командой build_similar_recipes. Каждый рецепт -
+разреженный вектор из ингредиентов и тегов (теги с весом
+SIMILAR_TAG_WEIGHT) с весами IDF, нормированный по длине. Для
+рецептов с similar_ready=False косинусная близость со всеми рецептами
+считается произведением разреженных матриц пачками по
+SIMILAR_BATCH_SIZE строк, и SIMILAR_RECIPES_COUNT ближайших соседей
+сохраняются в SimilarRecipe. API читает готовый список одним запросом
+по индексу (receipt, rank).
+
+Пачка из b рецептов даёт до b * N ненулевых близостей (N - число
+рецептов), поэтому память расчёта растёт с SIMILAR_BATCH_SIZE.
+Соседи остальных рецептов при инкрементальном пересчёте не меняются,
+полный пересчёт - build_similar_recipes --all.
+
+Флаг similar_ready ставится в той же транзакции, что и соседи пачки,
+и только рецептам, чья similar_version не изменилась с момента выборки:
+правка во время расчёта оставляет рецепт в следующем запуске.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from receipts.models import (AttachedIngredient, AttachedTag, Receipt,
+                             SimilarRecipe)
+from scipy import sparse
+
+# Ограничение на число параметров в одном запросе (SQLite - 999).
+UPDATE_CHUNK_SIZE = 500
+
+
+def load_pairs(queryset, field):
+    """Пары (id рецепта, id признака) в виде массива n x 2."""
+    return np.array(
+        list(queryset.values_list('receipt_id', field)), dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def load_vectors():
+    """Возвращает отсортированные id рецептов и матрицу
+    рецепт x признак с нормированными по длине строками."""
+    ingredients = load_pairs(AttachedIngredient.objects, 'ingredient_id')
+    tags = load_pairs(AttachedTag.objects, 'tag_id')
+    recipe_ids, rows = np.unique(
+        np.concatenate((ingredients[:, 0], tags[:, 0])), return_inverse=True)
+    if not len(recipe_ids):
+        return recipe_ids, sparse.csr_matrix((0, 0))
+    ingredient_ids, ingredient_columns = np.unique(
+        ingredients[:, 1], return_inverse=True)
+    tag_ids, tag_columns = np.unique(tags[:, 1], return_inverse=True)
+    columns = np.concatenate(
+        (ingredient_columns, tag_columns + len(ingredient_ids)))
+    size = len(ingredient_ids) + len(tag_ids)
+    weights = np.concatenate((
+        np.ones(len(ingredient_columns)),
+        np.full(len(tag_columns), settings.SIMILAR_TAG_WEIGHT),
+    ))
+    # Пары рецепт-признак уникальны, поэтому bincount - это частота
+    # признака по рецептам; редкие ингредиенты весят больше.
+    idf = np.log(len(recipe_ids) / np.maximum(
+        np.bincount(columns, minlength=size), 1)) + 1
+    matrix = sparse.csr_matrix(
+        (weights * idf[columns], (rows, columns)),
+        shape=(len(recipe_ids), size)
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    return recipe_ids, sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def top_neighbours(matrix, rows, count):
+    """Для каждой строки rows - (столбцы, близость) count ближайших
+    соседей по убыванию близости, без самой строки."""
+    scores = matrix[rows].dot(matrix.T).tocsr()
+    for position, row in enumerate(rows):
+        start, end = scores.indptr[position], scores.indptr[position + 1]
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+        keep = columns != row
+        columns, values = columns[keep], values[keep]
+        if len(values) > count:
+            top = np.argpartition(-values, count)[:count]
+            columns, values = columns[top], values[top]
+        # При равной близости выше - более новый рецепт (больший id).
+        order = np.lexsort((-columns, -values))
+        yield columns[order], values[order]
+
+
+def mark_ready(versions):
+    """Отмечает готовыми рецепты из словаря {id: версия}, версия
+    которых не изменилась."""
+    by_version = defaultdict(list)
+    for pk, version in versions.items():
+        by_version[version].append(pk)
+    for version, ids in by_version.items():
+        for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+            Receipt.objects.filter(
+                pk__in=ids[start:start + UPDATE_CHUNK_SIZE],
+                similar_version=version
+            ).update(similar_ready=True)
+
+
+def build_similar(rebuild_all=False):
+    """Пересчитывает соседей рецептов с similar_ready=False (или всех)
+    и возвращает количество пересчитанных рецептов."""
+    queryset = Receipt.objects.all()
+    if not rebuild_all:
+        queryset = queryset.filter(similar_ready=False)
+    # Версии запоминаются до загрузки векторов.
+    versions = dict(queryset.order_by('pk').values_list(
+        'pk', 'similar_version'))
+    if not versions:
+        return 0
+    pending = list(versions)
+    recipe_ids, matrix = load_vectors()
+    count = settings.SIMILAR_RECIPES_COUNT
+    batch_size = settings.SIMILAR_BATCH_SIZE
+    for start in range(0, len(pending), batch_size):
+        batch = np.array(pending[start:start + batch_size], dtype=np.int64)
+        rows = np.searchsorted(recipe_ids, batch)
+        found = rows < len(recipe_ids)
+        found[found] = recipe_ids[rows[found]] == batch[found]
+        entries = [
+            SimilarRecipe(
+                receipt_id=int(pk),
+                similar_id=int(recipe_ids[column]),
+                rank=rank,
+                score=float(score)
+            )
+            for pk, (columns, scores) in zip(
+                batch[found], top_neighbours(matrix, rows[found], count))
+            for rank, (column, score) in enumerate(zip(columns, scores))
+        ]
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                receipt_id__in=batch.tolist()).delete()
+            SimilarRecipe.objects.bulk_create(entries)
+            mark_ready({pk: versions[pk] for pk in batch.tolist()})
+    return len(pending)
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ..authentication import token_cache_key
+
+User = get_user_model()
+
+ME_URL = '/api/users/me/'
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@test.local', password='old-pass')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {0}'.format(self.token.key))
+
+    def test_token_lookup_is_cached(self):
+        # Токен с пользователем и проверка подписки на самого себя.
+        with self.assertNumQueries(2):
+            response = self.client.get(ME_URL)
+        self.assertEqual(response.data['username'], 'cook')
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    def test_user_changes_reset_cache(self):
+        self.client.get(ME_URL)
+        User.objects.filter(pk=self.user.pk).update(first_name='stale')
+        self.assertEqual(self.client.get(ME_URL).data['first_name'], '')
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'fresh'
+        user.save()
+        self.assertEqual(
+            self.client.get(ME_URL).data['first_name'], 'fresh')
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+    def test_set_password_resets_cache(self):
+        self.client.get(ME_URL)
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'old-pass',
+            'new_password': 'new-pass-123',
+        }, format='json')
+        self.assertEqual(response.status_code, 204, response.data)
+        with self.assertNumQueries(2):
+            self.client.get(ME_URL)
+
+    def test_logout_revokes_cached_token(self):
+        self.client.get(ME_URL)
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+    def test_cache_holds_snapshot_without_password(self):
+        self.client.get(ME_URL)
+        snapshot = cache.get(token_cache_key(self.token.key))
+        self.assertEqual(snapshot['id'], self.user.pk)
+        self.assertNotIn('password', snapshot)
+        self.assertTrue(all(
+            isinstance(value, (int, str)) for value in snapshot.values()))
+        # Текущий пароль проверяется по хэшу, загруженному из базы.
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'wrong',
+            'new_password': 'new-pass-123',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleted_user_loses_access(self):
+        self.client.get(ME_URL)
+        User.objects.get(pk=self.user.pk).delete()
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
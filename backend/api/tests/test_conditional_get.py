@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from receipts.models import Favorites, Receipt, Tag
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@test.local')
+        cls.other = User.objects.create_user(
+            username='other', email='other@test.local')
+        Tag.objects.create(name='breakfast', color='#FFFFFF', slug='breakfast')
+        cls.recipe = Receipt.objects.create(
+            author=cls.other,
+            name='omelette',
+            text='text',
+            image='receipts/test.png',
+            cooking_time=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_tags_not_modified(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        Tag.objects.create(name='lunch', color='#000000', slug='lunch')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_recipe_etag_depends_on_user_flags(self):
+        url = '/api/recipes/{0}/'.format(self.recipe.pk)
+        self.client.force_authenticate(self.user)
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('private', response['Cache-Control'])
+        self.client.force_authenticate(self.other)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.force_authenticate(self.user)
+        Favorites.objects.create(receipt=self.recipe, user=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_recipe_list_changes_with_recipes(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        self.assertEqual(
+            self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=etag).status_code,
+            304
+        )
+        self.assertNotEqual(
+            self.client.get('/api/recipes/', {'limit': 1})['ETag'], etag)
+        Receipt.objects.filter(pk=self.recipe.pk).first().delete()
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_counter_ordering_changes_with_counters(self):
+        params = {'ordering': '-favorites_count'}
+        etag = self.client.get('/api/recipes/', params)['ETag']
+        plain = self.client.get('/api/recipes/')['ETag']
+        Favorites.objects.create(receipt=self.recipe, user=self.user)
+        self.assertEqual(
+            self.client.get(
+                '/api/recipes/', params, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            200
+        )
+        self.assertEqual(
+            self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=plain).status_code,
+            304
+        )
+
+    def test_recipe_lookup_is_normalized(self):
+        url = '/api/recipes/0{0}/'.format(self.recipe.pk)
+        etag = self.client.get(url)['ETag']
+        Receipt.objects.filter(pk=self.recipe.pk).first().save()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
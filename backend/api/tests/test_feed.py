@@ -0,0 +1,151 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from receipts.models import FeedEntry, Receipt
+from rest_framework.test import APIClient
+from users.models import Subscribe
+
+from ..feed import backfill, fan_out, get_fan_out_on_read_authors
+
+User = get_user_model()
+
+FEED_URL = '/api/recipes/feed/'
+
+
+class RecipeFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@test.local')
+        cls.authors = [
+            User.objects.create_user(
+                username='author{0}'.format(index),
+                email='author{0}@test.local'.format(index)
+            )
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.now = timezone.now()
+
+    def create_recipe(self, author, minutes_ago):
+        recipe = Receipt.objects.create(
+            author=author,
+            name='recipe',
+            text='text',
+            image='receipts/test.png',
+            cooking_time=10
+        )
+        # pub_date проставляется auto_now_add, поэтому сдвигаем явно.
+        Receipt.objects.filter(pk=recipe.pk).update(
+            pub_date=self.now - timedelta(minutes=minutes_ago))
+        fan_out(recipe.pk)
+        return recipe
+
+    def get_ids(self, url=FEED_URL):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_fan_out_and_pagination(self):
+        Subscribe.objects.create(
+            author=self.authors[0], subscriber=self.reader)
+        Subscribe.objects.create(
+            author=self.authors[1], subscriber=self.reader)
+        recipes = [
+            self.create_recipe(self.authors[index % 3], minutes_ago=index)
+            for index in range(6)
+        ]
+        expected = [
+            recipe.pk for index, recipe in enumerate(recipes)
+            if index % 3 != 2
+        ]
+        self.assertEqual(FeedEntry.objects.filter(
+            user=self.reader).count(), 4)
+        response = self.client.get(FEED_URL, {'limit': 3})
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(ids, expected[:3])
+        self.assertEqual(self.get_ids(response.data['next']), expected[3:])
+
+    def test_subscribe_backfills_and_unsubscribe_removes(self):
+        recipe = self.create_recipe(self.authors[0], minutes_ago=1)
+        self.assertEqual(self.get_ids(), [])
+        Subscribe.objects.create(
+            author=self.authors[0], subscriber=self.reader)
+        # Дозаполнение идёт фоном после коммита, а не в запросе.
+        self.assertEqual(self.get_ids(), [])
+        backfill(self.reader.pk, self.authors[0].pk)
+        self.assertEqual(self.get_ids(), [recipe.pk])
+        Subscribe.objects.filter(
+            author=self.authors[0], subscriber=self.reader).delete()
+        self.assertEqual(self.get_ids(), [])
+        # Задача, дошедшая до потока после отписки, ничего не добавляет.
+        backfill(self.reader.pk, self.authors[0].pk)
+        self.assertEqual(self.get_ids(), [])
+
+    @override_settings(FEED_MAX_ENTRIES=2)
+    def test_prune_keeps_newest_entries(self):
+        Subscribe.objects.create(
+            author=self.authors[0], subscriber=self.reader)
+        Subscribe.objects.create(
+            author=self.authors[0], subscriber=self.authors[1])
+        recipes = [
+            self.create_recipe(self.authors[0], minutes_ago=index)
+            for index in range(4)
+        ]
+        Subscribe.objects.create(
+            author=self.authors[1], subscriber=self.authors[2])
+        self.create_recipe(self.authors[1], minutes_ago=0)
+        output = StringIO()
+        call_command('prune_feed', stdout=output)
+        self.assertIn('Pruned 4 feed entries', output.getvalue())
+        self.assertEqual(self.get_ids(), [recipes[0].pk, recipes[1].pk])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.authors[2]).count(), 1)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_fan_out_on_read_for_popular_authors(self):
+        popular, regular = self.authors[:2]
+        Subscribe.objects.create(author=popular, subscriber=self.reader)
+        Subscribe.objects.create(author=popular, subscriber=self.authors[2])
+        Subscribe.objects.create(author=regular, subscriber=self.reader)
+        # Множество популярных авторов кэшируется на FEED_AUTHORS_TTL.
+        cache.clear()
+        first = self.create_recipe(popular, minutes_ago=3)
+        second = self.create_recipe(regular, minutes_ago=2)
+        third = self.create_recipe(popular, minutes_ago=1)
+        self.assertFalse(
+            FeedEntry.objects.filter(author=popular).exists())
+        self.assertEqual(self.get_ids(), [third.pk, second.pk, first.pk])
+        response = self.client.get(FEED_URL, {'limit': 2})
+        self.assertEqual(self.get_ids(response.data['next']), [first.pk])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_followers_count_kept_by_signals(self):
+        author = User.objects.get(pk=self.authors[0].pk)
+        for subscriber in (self.reader, self.authors[1]):
+            Subscribe.objects.create(author=author, subscriber=subscriber)
+        # Полное сохранение устаревшего экземпляра не трогает счётчик.
+        author.first_name = 'author'
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_fan_out_on_read_authors(), {author.pk})
+        Subscribe.objects.filter(author=author).delete()
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+
+    def test_invalid_cursor_and_anonymous(self):
+        self.assertEqual(
+            self.client.get(FEED_URL, {'cursor': 'bad'}).status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(FEED_URL).status_code, 401)
@@ -0,0 +1,244 @@
+import base64
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from receipts.models import Receipt
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from ..fields import (Base64ImageField, ImageDecodeError, ImageTooLarge,
+                      decode_base64_image)
+from ..images import FORMATS, build_variants, variant_name
+from ..serializers import ShortRecipeSerializer
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_png(size=(800, 400)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 100, 50)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_data_uri(size):
+    return 'data:image/png;base64,' + base64.b64encode(
+        make_png(size)).decode()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_WORKERS=0)
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@test.local')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_recipe(self):
+        return Receipt.objects.create(
+            author=self.user,
+            name='recipe',
+            text='text',
+            image=default_storage.save(
+                'receipts/photo.png', ContentFile(make_png())),
+            cooking_time=10
+        )
+
+    def test_build_variants(self):
+        recipe = self.create_recipe()
+        self.assertTrue(build_variants(recipe.pk))
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image_variants_ready)
+        for fmt in FORMATS:
+            with default_storage.open(
+                variant_name(recipe.image.name, 'small', fmt)
+            ) as file:
+                self.assertEqual(Image.open(file).size, (200, 100))
+        preview = ShortRecipeSerializer(recipe).data
+        self.assertIn('variants', preview['image'])
+
+    def test_images_in_recipe_response(self):
+        recipe = self.create_recipe()
+        client = APIClient()
+        url = '/api/recipes/{0}/'.format(recipe.pk)
+        self.assertEqual(client.get(url).data['images'], {})
+        call_command('build_image_variants', stdout=StringIO())
+        images = client.get(url).data['images']
+        self.assertEqual(set(images), {'small', 'medium'})
+        self.assertEqual(set(images['small']), set(FORMATS))
+
+    def test_list_etag_changes_when_variants_ready(self):
+        cache.clear()
+        recipe = self.create_recipe()
+        client = APIClient()
+        etag = client.get('/api/recipes/')['ETag']
+        build_variants(recipe.pk)
+        response = client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotEqual(response.data['results'][0]['images'], {})
+
+    def test_create_accepts_image_without_imghdr(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/recipes/', {
+            'name': 'recipe',
+            'text': 'text',
+            'cooking_time': 10,
+            'image': make_data_uri((2, 2)),
+            'tags': [],
+            'ingredients': [],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(response.data['image'].endswith('.png'))
+        self.assertEqual(response.data['images'], {})
+
+    def post_multipart(self, client, data, image, url='/api/recipes/',
+                       method='post'):
+        return getattr(client, method)(url, {
+            'data': json.dumps(data),
+            'image': SimpleUploadedFile('photo.png', image),
+        }, format='multipart')
+
+    def test_create_and_update_from_multipart(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = {
+            'name': 'recipe',
+            'text': 'text',
+            'cooking_time': 10,
+            'tags': [],
+            'ingredients': [],
+        }
+        response = self.post_multipart(client, data, make_png((4, 4)))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(response.data['image'].endswith('.png'))
+        recipe = Receipt.objects.get()
+        with recipe.image.open() as file:
+            self.assertEqual(Image.open(file).size, (4, 4))
+        data['name'] = 'renamed'
+        response = self.post_multipart(
+            client, data, make_png((8, 8)),
+            url='/api/recipes/{0}/'.format(recipe.pk), method='put')
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'renamed')
+        with recipe.image.open() as file:
+            self.assertEqual(Image.open(file).size, (8, 8))
+
+    @override_settings(MAX_IMAGE_SIZE=100)
+    def test_multipart_errors(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/recipes/', {
+            'data': '[1, 2',
+            'image': SimpleUploadedFile('photo.png', make_png((4, 4))),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        response = self.post_multipart(
+            client, {'name': 'recipe'}, make_png((200, 200)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger', str(response.data['image']))
+
+
+class Base64DecodeTest(TestCase):
+    def encode(self, content):
+        return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+    @override_settings(IMAGE_SPOOL_SIZE=1024)
+    def test_decodes_in_chunks(self):
+        content = make_png((300, 300))
+        image = decode_base64_image(self.encode(content), chunk_size=16)
+        self.assertTrue(image.name.endswith('.png'))
+        self.assertEqual(image.size, len(content))
+        self.assertEqual(image.read(), content)
+
+    def test_accepts_line_wrapped_payload(self):
+        content = make_png((300, 300))
+        wrapped = base64.encodebytes(content).decode()
+        for data in (
+            'data:image/png;base64,' + wrapped,
+            ' ' + wrapped.replace('\n', '\r\n'),
+        ):
+            image = decode_base64_image(data, chunk_size=16)
+            self.assertEqual(image.size, len(content))
+            self.assertEqual(image.read(), content)
+
+    def test_size_checked_before_decoding(self):
+        with self.assertRaises(ImageTooLarge):
+            decode_base64_image('A' * 4000, max_size=100)
+
+    def test_rejects_invalid_data(self):
+        for data in ('data:image/png,abc', 'abc', '!!!!',
+                     self.encode(b'not an image at all')):
+            with self.assertRaises(ImageDecodeError):
+                decode_base64_image(data)
+
+    @override_settings(MAX_IMAGE_SIZE=100)
+    def test_field_errors(self):
+        field = Base64ImageField()
+        with self.assertRaisesMessage(
+                ValidationError, 'Image is larger than 100 bytes.'):
+            field.run_validation(self.encode(make_png((50, 50))))
+        broken = self.encode(b'\x89PNG\r\n\x1a\n' + b'0' * 20)
+        with self.assertRaises(ValidationError):
+            field.run_validation(broken)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_WORKERS=0)
+class ImageReplaceTest(TransactionTestCase):
+    """Копии строятся и удаляются в on_commit, которого нет в TestCase."""
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get_variants(self, name):
+        return [
+            default_storage.exists(variant_name(name, size, fmt))
+            for size in ('small', 'medium') for fmt in FORMATS
+        ]
+
+    def test_replacing_image_rebuilds_variants(self):
+        user = User.objects.create_user(
+            username='cook', email='cook@test.local')
+        client = APIClient()
+        client.force_authenticate(user)
+        data = {
+            'name': 'recipe', 'text': 'text', 'cooking_time': 10,
+            'image': make_data_uri((40, 40)), 'tags': [], 'ingredients': [],
+        }
+        response = client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Receipt.objects.get()
+        old_name = recipe.image.name
+        self.assertTrue(recipe.image_variants_ready)
+        self.assertTrue(all(self.get_variants(old_name)))
+        # Полное сохранение не сбрасывает флаг готового рецепта.
+        recipe.name = 'renamed'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image_variants_ready)
+
+        data['image'] = make_data_uri((60, 60))
+        response = client.put(
+            '/api/recipes/{0}/'.format(recipe.pk), data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.image.name, old_name)
+        self.assertTrue(recipe.image_variants_ready)
+        self.assertFalse(any(self.get_variants(old_name)))
+        self.assertTrue(all(self.get_variants(recipe.image.name)))
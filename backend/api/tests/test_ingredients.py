@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from receipts.models import Ingredient, Tag
+from rest_framework.test import APIClient
+
+from ..ingredient_index import ingredient_index, warm_up
+
+INGREDIENTS_URL = '/api/ingredients/'
+
+
+class IngredientSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Абрикос', 'абрикосовый сок', 'апельсин', 'соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+        self.client = APIClient()
+
+    def search(self, name):
+        return [
+            ingredient['name'] for ingredient in
+            self.client.get(INGREDIENTS_URL, {'name': name}).data
+        ]
+
+    def test_prefix_search_is_case_insensitive(self):
+        self.assertEqual(self.search('АБР'), ['Абрикос', 'абрикосовый сок'])
+        self.assertEqual(self.search('с'), ['соль'])
+        self.assertEqual(self.search('x'), [])
+
+    def test_search_does_not_query_database(self):
+        self.search('а')
+        with self.assertNumQueries(0):
+            self.search('а')
+
+    def test_warm_up_builds_index_before_first_request(self):
+        warm_up()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('со'), ['соль'])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=1)
+    def test_result_cap(self):
+        self.assertEqual(self.search('а'), ['Абрикос'])
+
+    def test_index_rebuilt_after_save_and_delete(self):
+        self.assertEqual(self.search('ан'), [])
+        ingredient = Ingredient.objects.create(
+            name='ананас', measurement_unit='г')
+        self.assertEqual(self.search('ан'), ['ананас'])
+        ingredient.delete()
+        self.assertEqual(self.search('ан'), [])
+
+
+class ReferenceListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        Tag.objects.create(name='breakfast', color='#FFFFFF', slug='breakfast')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_lists_served_from_memory(self):
+        for url in (INGREDIENTS_URL, '/api/tags/'):
+            first = self.client.get(url).data
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).data, first)
+                pk = first[0]['id']
+                response = self.client.get('{0}{1}/'.format(url, pk))
+            self.assertEqual(response.data, first[0])
+            self.assertEqual(
+                self.client.get('{0}0/'.format(url)).status_code, 404)
+
+    def test_list_reloaded_after_save(self):
+        self.client.get(INGREDIENTS_URL)
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+        response = self.client.get(INGREDIENTS_URL)
+        self.assertEqual(
+            [item['name'] for item in response.data], ['соль', 'перец'])
@@ -0,0 +1,63 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+# Пользователи тоже откатываются: более поздние поля User не известны
+# исторической модели.
+BEFORE = [('receipts', '0010_search'), ('users', '0003_subscribe_unique')]
+AFTER = [('receipts', '0012_unique_join_tables')]
+
+
+class MergeDuplicatesMigrationTest(TransactionTestCase):
+    """Дубликаты, накопившиеся до 0011, сливаются без потери
+    количеств, и 0012 добавляет ограничения уникальности."""
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_merged_and_amounts_summed(self):
+        apps = self.migrate(BEFORE)
+        User = apps.get_model('users', 'User')
+        Ingredient = apps.get_model('receipts', 'Ingredient')
+        Tag = apps.get_model('receipts', 'Tag')
+        Receipt = apps.get_model('receipts', 'Receipt')
+        AttachedIngredient = apps.get_model('receipts', 'AttachedIngredient')
+        AttachedTag = apps.get_model('receipts', 'AttachedTag')
+        Favorites = apps.get_model('receipts', 'Favorites')
+        author = User.objects.create(
+            username='author', email='author@test.local')
+        salt, salt_copy = (
+            Ingredient.objects.create(name='salt', measurement_unit='g')
+            for _ in range(2)
+        )
+        tag = Tag.objects.create(name='tag', color='#FFFFFF', slug='tag')
+        recipe = Receipt.objects.create(
+            author=author, name='recipe', text='text',
+            image='receipts/test.png', cooking_time=5)
+        AttachedIngredient.objects.create(
+            receipt=recipe, ingredient=salt, amount=2)
+        AttachedIngredient.objects.create(
+            receipt=recipe, ingredient=salt_copy, amount=3)
+        for _ in range(2):
+            AttachedTag.objects.create(receipt=recipe, tag=tag)
+            Favorites.objects.create(receipt=recipe, user=author)
+
+        apps = self.migrate(AFTER)
+        Ingredient = apps.get_model('receipts', 'Ingredient')
+        AttachedIngredient = apps.get_model('receipts', 'AttachedIngredient')
+        self.assertEqual(
+            list(Ingredient.objects.values_list('id', flat=True)),
+            [salt.id])
+        self.assertEqual(
+            list(AttachedIngredient.objects.values_list(
+                'ingredient_id', 'amount')),
+            [(salt.id, 5)])
+        self.assertEqual(
+            apps.get_model('receipts', 'AttachedTag').objects.count(), 1)
+        self.assertEqual(
+            apps.get_model('receipts', 'Favorites').objects.count(), 1)
@@ -0,0 +1,212 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from receipts.models import (AttachedIngredient, AttachedTag, Favorites,
+                             Ingredient, Receipt, ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscribe
+
+from ..middleware import get_query_budget
+from ..urls import router_v1
+
+User = get_user_model()
+
+SEED_SIZE = 10
+IMPORT_LINES = 3
+WRITE_METHODS = ('post', 'put', 'patch', 'delete')
+SMALL_PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAA'
+    'DElEQVR4nGNgYGAAAAAEAAH2FzhVAAAAAElFTkSuQmCC'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def get_routes():
+    """Возвращает (имя маршрута, detail) для всех GET-маршрутов роутера."""
+    for pattern in router_v1.urls:
+        name = pattern.name
+        actions = getattr(pattern.callback, 'actions', None)
+        if (
+            not actions
+            or 'get' not in actions
+            or 'format' in pattern.pattern.regex.groupindex
+        ):
+            continue
+        yield name, 'pk' in pattern.pattern.regex.groupindex
+
+
+def get_write_routes():
+    """Возвращает (имя маршрута, метод) для всех изменяющих маршрутов."""
+    for pattern in router_v1.urls:
+        actions = getattr(pattern.callback, 'actions', None) or {}
+        if 'format' in pattern.pattern.regex.groupindex:
+            continue
+        for method in actions:
+            if method in WRITE_METHODS:
+                yield pattern.name, method.upper()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(TestCase):
+    """Прогоняет все маршруты api/urls.py на заполненной базе
+    и проверяет, что ни один не выходит за бюджет запросов."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='budget', email='budget@test.local', is_staff=True,
+            password='budget-password')
+        cls.token = Token.objects.create(user=cls.user)
+        ingredients = [
+            Ingredient.objects.create(
+                name='ingredient {0}'.format(index), measurement_unit='g')
+            for index in range(SEED_SIZE)
+        ]
+        tags = [
+            Tag.objects.create(
+                name='tag {0}'.format(index),
+                color='#0000{0:02d}'.format(index),
+                slug='tag-{0}'.format(index)
+            )
+            for index in range(3)
+        ]
+        for index in range(SEED_SIZE):
+            author = User.objects.create_user(
+                username='author{0}'.format(index),
+                email='author{0}@test.local'.format(index)
+            )
+            Subscribe.objects.create(author=author, subscriber=cls.user)
+            for number in range(3):
+                recipe = Receipt.objects.create(
+                    author=author,
+                    name='recipe {0}-{1}'.format(index, number),
+                    text='text',
+                    image='receipts/test.png',
+                    cooking_time=10
+                )
+                for ingredient in ingredients:
+                    AttachedIngredient.objects.create(
+                        receipt=recipe, ingredient=ingredient, amount=1)
+                for tag in tags:
+                    AttachedTag.objects.create(receipt=recipe, tag=tag)
+                Favorites.objects.create(receipt=recipe, user=cls.user)
+                ShoppingCart.objects.create(receipt=recipe, user=cls.user)
+        cls.detail_pks = {
+            'users': cls.user.pk,
+            'recipes': Receipt.objects.first().pk,
+            'tags': tags[0].pk,
+            'ingredients': ingredients[0].pk,
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {0}'.format(self.token.key))
+
+    def get_url(self, name, detail):
+        if not detail:
+            return reverse(name)
+        basename = name.split('-', 1)[0]
+        return reverse(name, kwargs={'pk': self.detail_pks[basename]})
+
+    def test_routes_within_query_budget(self):
+        routes = list(get_routes())
+        self.assertTrue(routes)
+        for name, detail in routes:
+            with self.subTest(route=name):
+                response = self.client.get(self.get_url(name, detail))
+                self.assertEqual(response.status_code, 200)
+                queries = int(response['X-DB-Queries'])
+                self.assertLessEqual(queries, get_query_budget(name))
+                self.assertIn('db;dur=', response['Server-Timing'])
+
+    def get_recipe_payload(self, amount=2, skip=0):
+        """Тело рецепта; amount и skip (сколько первых тегов
+        и ингредиентов убрать) задают правку при PUT и PATCH."""
+        return {
+            'name': 'budget recipe',
+            'text': 'text',
+            'cooking_time': 10,
+            'image': SMALL_PNG,
+            'tags': list(Tag.objects.values_list('id', flat=True))[skip:],
+            'ingredients': [
+                {'id': pk, 'amount': amount}
+                for pk in Ingredient.objects.values_list(
+                    'id', flat=True)[skip:]
+            ],
+        }
+
+    def get_requests(self):
+        """(имя маршрута, метод, kwargs маршрута, данные) по порядку:
+        созданный рецепт меняется и удаляется последним."""
+        created = {}
+        yield 'users-list', 'POST', {}, {
+            'email': 'new@test.local', 'username': 'new',
+            'first_name': 'new', 'last_name': 'user',
+            'password': 'new-password',
+        }
+        yield 'users-set-password', 'POST', {}, {
+            'current_password': 'budget-password',
+            'new_password': 'budget-password-2',
+        }
+        author = User.objects.create_user(
+            username='unfollowed', email='unfollowed@test.local')
+        for method in ('POST', 'DELETE'):
+            yield 'users-subscribe', method, {'pk': author.pk}, None
+        yield 'recipes-list', 'POST', {}, self.get_recipe_payload()
+        created['pk'] = Receipt.objects.get(name='budget recipe').pk
+        # PUT убирает теги и ингредиенты и меняет количества,
+        # PATCH возвращает их обратно.
+        yield 'recipes-detail', 'PUT', created, self.get_recipe_payload(
+            amount=3, skip=1)
+        yield 'recipes-detail', 'PATCH', created, self.get_recipe_payload()
+        for name in ('recipes-favorite', 'recipes-shopping-cart'):
+            for method in ('POST', 'DELETE'):
+                yield name, method, created, None
+        # Несколько строк: без RETURNING рецепты вставляются по одному.
+        yield 'recipes-import-recipes', 'POST', {}, '\n'.join(
+            json.dumps({
+                'name': 'imported {0}'.format(index), 'text': 'text',
+                'cooking_time': 5, 'image': 'receipts/test.png',
+                'tags': [],
+                'ingredients': [{
+                    'name': 'ingredient 0', 'measurement_unit': 'g',
+                    'amount': 1,
+                }],
+            })
+            for index in range(IMPORT_LINES)
+        )
+        yield 'recipes-detail', 'DELETE', created, None
+
+    def send(self, name, method, kwargs, data):
+        url = reverse(name, kwargs=kwargs)
+        if name == 'recipes-import-recipes':
+            return self.client.generic(
+                method, url, data, content_type='application/x-ndjson')
+        return getattr(self.client, method.lower())(url, data, format='json')
+
+    def test_write_routes_within_query_budget(self):
+        checked = set()
+        for name, method, kwargs, data in self.get_requests():
+            with self.subTest(route=name, method=method):
+                cache.clear()
+                response = self.send(name, method, kwargs, data)
+                self.assertLess(response.status_code, 300, response.data)
+                queries = int(response['X-DB-Queries'])
+                self.assertLessEqual(
+                    queries, get_query_budget(name, method))
+                self.assertIn(
+                    '{0} {1}'.format(method, name), settings.QUERY_BUDGETS)
+            checked.add((name, method))
+        self.assertEqual(checked, set(get_write_routes()))
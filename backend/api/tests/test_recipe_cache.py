@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from receipts.models import (AttachedIngredient, AttachedTag, Favorites,
+                             Ingredient, Receipt, Tag)
+from rest_framework.test import APIClient
+from users.models import Subscribe
+
+User = get_user_model()
+
+
+class RecipeCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@test.local')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@test.local')
+        cls.ingredient = Ingredient.objects.create(
+            name='salt', measurement_unit='g')
+        cls.tag = Tag.objects.create(
+            name='breakfast', color='#FFFFFF', slug='breakfast')
+        cls.recipe = Receipt.objects.create(
+            author=cls.author,
+            name='omelette',
+            text='text',
+            image='receipts/test.png',
+            cooking_time=5
+        )
+        cls.attached = AttachedIngredient.objects.create(
+            receipt=cls.recipe, ingredient=cls.ingredient, amount=2)
+        AttachedTag.objects.create(receipt=cls.recipe, tag=cls.tag)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.url = '/api/recipes/{0}/'.format(self.recipe.pk)
+
+    def test_detail_served_from_cache(self):
+        self.assertEqual(self.client.get(self.url).data['name'], 'omelette')
+        # тело из кэша, флаги читателя - одним запросом
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 2)
+
+    def test_missing_recipe(self):
+        self.assertEqual(self.client.get('/api/recipes/0/').status_code, 404)
+        self.assertEqual(
+            self.client.get('/api/recipes/abc/').status_code, 404)
+
+    def test_flags_are_per_user(self):
+        self.client.get(self.url)
+        Favorites.objects.create(receipt=self.recipe, user=self.reader)
+        Subscribe.objects.create(author=self.author, subscriber=self.reader)
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+        self.client.force_authenticate(self.author)
+        response = self.client.get(self.url)
+        self.assertFalse(response.data['is_favorited'])
+        self.assertFalse(response.data['author']['is_subscribed'])
+        self.client.force_authenticate(None)
+        self.assertFalse(self.client.get(self.url).data['is_favorited'])
+
+    def test_writes_invalidate_bodies(self):
+        self.client.get(self.url)
+        self.attached.amount = 3
+        self.attached.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 3)
+        self.tag.name = 'lunch'
+        self.tag.save()
+        self.assertEqual(
+            self.client.get(self.url).data['tags'][0]['name'], 'lunch')
+        self.author.first_name = 'Ivan'
+        self.author.save()
+        self.assertEqual(
+            self.client.get(self.url).data['author']['first_name'], 'Ivan')
+        other = Receipt.objects.create(
+            author=self.reader, name='other', text='text',
+            image='receipts/test.png', cooking_time=5)
+        other_url = '/api/recipes/{0}/'.format(other.pk)
+        self.client.get(other_url)
+        self.client.get(self.url)
+        self.author.set_password('password')
+        self.author.save(update_fields=['password'])
+        self.author.last_name = 'Petrov'
+        self.author.save()
+        # Тело чужого рецепта осталось в кэше, своё - пересобрано.
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+        self.assertEqual(
+            self.client.get(self.url).data['author']['last_name'], 'Petrov')
+        Receipt.objects.filter(pk=self.recipe.pk).first().delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from receipts.models import (AttachedIngredient, AttachedTag, Ingredient,
+                             Receipt, Tag)
+from rest_framework.test import APIClient
+
+from ..recipe_io import RecipeImporter
+
+User = get_user_model()
+
+SMALL_PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAA'
+    'DElEQVR4nGNgYGAAAAAEAAH2FzhVAAAAAElFTkSuQmCC'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_line(image):
+    return json.dumps({
+        'name': 'imported', 'text': 'text', 'cooking_time': 5,
+        'image': image,
+        'ingredients': [
+            {'name': 'salt', 'measurement_unit': 'g', 'amount': 1}],
+    })
+
+
+class RecipeImportExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@test.local', is_staff=True)
+        cls.salt = Ingredient.objects.create(
+            name='salt', measurement_unit='g')
+        cls.tag = Tag.objects.create(
+            name='breakfast', color='#FFFFFF', slug='breakfast')
+        recipe = Receipt.objects.create(
+            author=cls.admin,
+            name='omelette',
+            text='text',
+            image='receipts/omelette.png',
+            cooking_time=5
+        )
+        AttachedIngredient.objects.create(
+            receipt=recipe, ingredient=cls.salt, amount=2)
+        AttachedTag.objects.create(receipt=recipe, tag=cls.tag)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_export(self):
+        response = self.client.get('/api/recipes/export/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        recipe = json.loads(lines[0])
+        self.assertEqual(recipe['name'], 'omelette')
+        self.assertEqual(recipe['author'], 'admin')
+        self.assertEqual(recipe['tags'], ['breakfast'])
+        self.assertEqual(
+            recipe['ingredients'],
+            [{'name': 'salt', 'measurement_unit': 'g', 'amount': 2}]
+        )
+
+    def test_import_reports_errors_per_line(self):
+        exported = b''.join(
+            self.client.get('/api/recipes/export/').streaming_content
+        ).decode()
+        broken = json.loads(exported)
+        broken['tags'] = ['unknown']
+        body = '\n'.join((
+            exported.strip(),
+            'not json',
+            json.dumps(broken),
+            exported.strip(),
+        ))
+        response = self.client.generic(
+            'POST', '/api/recipes/import/', body,
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            [error['line'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(Receipt.objects.count(), 3)
+        self.assertEqual(
+            AttachedIngredient.objects.filter(ingredient=self.salt).count(),
+            3
+        )
+
+    def test_admin_only(self):
+        user = User.objects.create_user(
+            username='user', email='user@test.local')
+        self.client.force_authenticate(user)
+        self.assertEqual(
+            self.client.get('/api/recipes/export/').status_code, 403)
+        self.assertEqual(
+            self.client.post('/api/recipes/import/').status_code, 403)
+
+    def test_image_paths_outside_root_rejected(self):
+        lines = [
+            make_line(image) for image in (
+                '../settings.py', '/etc/passwd', 'receipts/../../x.png',
+                'receipts\\..\\x.png', 'receipts/./a.png',
+            )
+        ]
+        importer = RecipeImporter(author=self.admin).run(lines)
+        self.assertEqual(
+            [number for number, _ in importer.errors], [1, 2, 3, 4])
+        self.assertEqual(importer.created, 1)
+        self.assertTrue(
+            Receipt.objects.filter(image='receipts/a.png').exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeImportImagesTest(TransactionTestCase):
+    """on_commit в TestCase не выполняется, поэтому нужны настоящие
+    транзакции."""
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@test.local', is_staff=True)
+        Ingredient.objects.create(name='salt', measurement_unit='g')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get_files(self):
+        return os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'receipts'))
+
+    def test_images_written_after_commit(self):
+        importer = RecipeImporter(author=self.admin).run(
+            [make_line(SMALL_PNG)])
+        self.assertEqual(importer.created, 1)
+        recipe = Receipt.objects.get()
+        self.assertEqual(
+            self.get_files(), [os.path.basename(recipe.image.name)])
+
+    def test_rolled_back_import_leaves_no_files(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                RecipeImporter(author=self.admin).run([make_line(SMALL_PNG)])
+                raise RuntimeError
+        self.assertFalse(Receipt.objects.exists())
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_MEDIA_ROOT, 'receipts')))
@@ -0,0 +1,607 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from receipts.models import (AttachedIngredient, AttachedTag, Favorites,
+                             Ingredient, Receipt, ShoppingCart, Tag)
+from rest_framework.test import APIClient
+from users.models import Subscribe
+
+User = get_user_model()
+
+RECIPES_URL = '/api/recipes/'
+SMALL_PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAA'
+    'DElEQVR4nGNgYGAAAAAEAAH2FzhVAAAAAElFTkSuQmCC'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class RecipeListQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@test.local')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name='ingredient {0}'.format(index), measurement_unit='g')
+            for index in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name='tag {0}'.format(index),
+                color='#00000{0}'.format(index),
+                slug='tag-{0}'.format(index)
+            )
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count):
+        for index in range(count):
+            author = User.objects.create_user(
+                username='author{0}'.format(index),
+                email='author{0}@test.local'.format(index)
+            )
+            recipe = Receipt.objects.create(
+                author=author,
+                name='recipe {0}'.format(index),
+                text='text',
+                image='receipts/test.png',
+                cooking_time=10
+            )
+            for ingredient in self.ingredients:
+                AttachedIngredient.objects.create(
+                    receipt=recipe, ingredient=ingredient, amount=index + 1)
+            for tag in self.tags:
+                AttachedTag.objects.create(receipt=recipe, tag=tag)
+            if index % 2:
+                Favorites.objects.create(receipt=recipe, user=self.user)
+                ShoppingCart.objects.create(receipt=recipe, user=self.user)
+                Subscribe.objects.create(author=author, subscriber=self.user)
+
+    def get_page(self, limit):
+        return self.client.get(RECIPES_URL, {'limit': limit})
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.create_recipes(10)
+        for limit in (1, 10):
+            cache.clear()
+            # count, id страницы, рецепты с флагами, ингредиенты, теги
+            with self.assertNumQueries(5):
+                response = self.get_page(limit)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_flags_come_from_annotations(self):
+        self.create_recipes(2)
+        results = {
+            recipe['name']: recipe for recipe in
+            self.get_page(10).data['results']
+        }
+        self.assertTrue(results['recipe 1']['is_favorited'])
+        self.assertTrue(results['recipe 1']['is_in_shopping_cart'])
+        self.assertTrue(results['recipe 1']['author']['is_subscribed'])
+        self.assertFalse(results['recipe 0']['is_favorited'])
+        self.assertFalse(results['recipe 0']['is_in_shopping_cart'])
+        self.assertFalse(results['recipe 0']['author']['is_subscribed'])
+        self.assertEqual(len(results['recipe 0']['ingredients']), 3)
+        self.assertEqual(len(results['recipe 0']['tags']), 2)
+
+    def test_count_is_cached_until_write(self):
+        self.create_recipes(2)
+        self.get_page(1)
+        # count и тело рецепта берутся из кэша, флаги пользователя
+        # загружаются одним запросом и тоже кэшируются
+        with self.assertNumQueries(2):
+            self.get_page(1)
+        with self.assertNumQueries(1):
+            response = self.get_page(1)
+        self.assertEqual(response.data['count'], 2)
+        self.assertFalse(response.data['count_approximate'])
+        Receipt.objects.create(
+            author=self.user,
+            name='new recipe',
+            text='text',
+            image='receipts/test.png',
+            cooking_time=10
+        )
+        self.assertEqual(self.get_page(1).data['count'], 3)
+
+    def test_user_filter_count_follows_favorites(self):
+        self.create_recipes(4)
+        params = {'is_favorited': 1, 'limit': 1}
+        self.assertEqual(
+            self.client.get(RECIPES_URL, params).data['count'], 2)
+        Favorites.objects.create(
+            receipt=Receipt.objects.get(name='recipe 0'), user=self.user)
+        self.assertEqual(
+            self.client.get(RECIPES_URL, params).data['count'], 3)
+        other = User.objects.create_user(
+            username='other', email='other@test.local')
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(RECIPES_URL, params).data['count'], 0)
+
+    def test_anonymous_list(self):
+        self.create_recipes(2)
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(5):
+            response = self.get_page(10)
+        self.assertFalse(response.data['results'][0]['is_favorited'])
+
+
+class RecipeSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='cook', email='cook@test.local')
+        for name, text in (
+            ('Borscht', 'beetroot, cabbage'),
+            ('Salad with cabbage', 'fresh cabbage'),
+            ('Cabbage pie', 'dough'),
+            ('Pancakes', 'flour, milk'),
+        ):
+            Receipt.objects.create(
+                author=author,
+                name=name,
+                text=text,
+                image='receipts/test.png',
+                cooking_time=10
+            )
+
+    def test_search_ranks_name_matches_first(self):
+        response = APIClient().get(RECIPES_URL, {'search': 'cabbage'})
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Cabbage pie', 'Salad with cabbage', 'Borscht']
+        )
+
+    def test_search_vector_read_only_by_search(self):
+        with CaptureQueriesContext(connection) as queries:
+            APIClient().get(RECIPES_URL)
+            list(Receipt.objects.with_related())
+        self.assertFalse(any(
+            'search_vector' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeWriteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='writer', email='writer@test.local')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name='ingredient {0}'.format(index), measurement_unit='g')
+            for index in range(4)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name='tag {0}'.format(index),
+                color='#00000{0}'.format(index),
+                slug='tag-{0}'.format(index)
+            )
+            for index in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_payload(self, amounts, tags):
+        return {
+            'name': 'recipe',
+            'text': 'text',
+            'cooking_time': 10,
+            'image': SMALL_PNG,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in amounts
+            ],
+        }
+
+    def test_create(self):
+        response = self.client.post(RECIPES_URL, self.get_payload(
+            [(self.ingredients[0], 5), (self.ingredients[1], 7)],
+            self.tags[:2]
+        ), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Receipt.objects.get()
+        self.assertEqual(
+            dict(recipe.attached_ingredients.values_list(
+                'ingredient_id', 'amount')),
+            {self.ingredients[0].id: 5, self.ingredients[1].id: 7}
+        )
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {self.tags[0].id, self.tags[1].id}
+        )
+
+    def test_create_queries_do_not_depend_on_ingredient_count(self):
+        counts = []
+        for size in (1, 4):
+            amounts = [(item, 1) for item in self.ingredients[:size]]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    RECIPES_URL,
+                    self.get_payload(amounts, self.tags[:size]),
+                    format='json'
+                )
+            self.assertEqual(response.status_code, 201, response.data)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_unknown_ids_rejected(self):
+        payload = self.get_payload([(self.ingredients[0], 1)], self.tags[:1])
+        payload['ingredients'][0]['id'] = 0
+        response = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        payload = self.get_payload([(self.ingredients[0], 1)], self.tags[:1])
+        payload['tags'] = [0]
+        response = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Receipt.objects.exists())
+
+    def test_duplicate_ingredients_rejected(self):
+        response = self.client.post(RECIPES_URL, self.get_payload(
+            [(self.ingredients[0], 5), (self.ingredients[0], 7)],
+            self.tags[:1]
+        ), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Receipt.objects.exists())
+
+    def test_update_writes_only_the_diff(self):
+        self.client.post(RECIPES_URL, self.get_payload(
+            [(self.ingredients[0], 5), (self.ingredients[1], 7),
+             (self.ingredients[2], 1)],
+            self.tags[:2]
+        ), format='json')
+        recipe = Receipt.objects.get()
+        kept = recipe.attached_ingredients.get(
+            ingredient=self.ingredients[0])
+        changed = recipe.attached_ingredients.get(
+            ingredient=self.ingredients[1])
+        kept_tag = AttachedTag.objects.get(receipt=recipe, tag=self.tags[1])
+        response = self.client.put(
+            '{0}{1}/'.format(RECIPES_URL, recipe.id),
+            self.get_payload(
+                [(self.ingredients[0], 5), (self.ingredients[1], 9),
+                 (self.ingredients[3], 2)],
+                self.tags[1:]
+            ),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            dict(recipe.attached_ingredients.values_list(
+                'ingredient_id', 'amount')),
+            {self.ingredients[0].id: 5, self.ingredients[1].id: 9,
+             self.ingredients[3].id: 2}
+        )
+        self.assertTrue(
+            recipe.attached_ingredients.filter(id=kept.id, amount=5).exists())
+        self.assertTrue(
+            recipe.attached_ingredients.filter(id=changed.id).exists())
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {self.tags[1].id, self.tags[2].id}
+        )
+        self.assertTrue(AttachedTag.objects.filter(id=kept_tag.id).exists())
+
+
+class RecipeFavoriteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='fan', email='fan@test.local')
+        cls.recipe = Receipt.objects.create(
+            author=cls.user,
+            name='recipe',
+            text='text',
+            image='receipts/test.png',
+            cooking_time=10
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_twice_and_remove(self):
+        for action, model in (('favorite', Favorites),
+                              ('shopping_cart', ShoppingCart)):
+            url = '{0}{1}/{2}/'.format(RECIPES_URL, self.recipe.pk, action)
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.client.post(url).status_code, 400)
+            self.assertEqual(model.objects.count(), 1)
+            self.assertEqual(self.client.delete(url).status_code, 204)
+            self.assertEqual(self.client.delete(url).status_code, 400)
+            self.assertEqual(model.objects.count(), 0)
+
+
+class RecipeCountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username='user{0}'.format(index),
+                email='user{0}@test.local'.format(index)
+            )
+            for index in range(3)
+        ]
+        cls.recipes = [
+            Receipt.objects.create(
+                author=cls.users[0],
+                name='recipe {0}'.format(index),
+                text='text',
+                image='receipts/test.png',
+                cooking_time=10
+            )
+            for index in range(3)
+        ]
+
+    def test_counters_follow_favorites_and_carts(self):
+        recipe = self.recipes[0]
+        for user in self.users:
+            Favorites.objects.create(receipt=recipe, user=user)
+        ShoppingCart.objects.create(receipt=recipe, user=self.users[0])
+        Favorites.objects.filter(user=self.users[1]).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 2)
+        self.assertEqual(recipe.in_carts_count, 1)
+
+    def test_cascade_deletes_update_counters_in_bulk(self):
+        for recipe in self.recipes:
+            Favorites.objects.create(receipt=recipe, user=self.users[1])
+            Favorites.objects.create(receipt=recipe, user=self.users[2])
+        Favorites.objects.get(
+            receipt=self.recipes[0], user=self.users[2]).delete()
+        user = User.objects.get(pk=self.users[1].pk)
+        with CaptureQueriesContext(connection) as queries:
+            user.delete()
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            list(Receipt.objects.order_by('pk').values_list(
+                'favorites_count', flat=True)),
+            [0, 1, 1]
+        )
+        Receipt.objects.get(pk=self.recipes[1].pk).delete()
+        self.assertEqual(Favorites.objects.count(), 1)
+
+    def test_save_keeps_counters(self):
+        recipe = Receipt.objects.get(pk=self.recipes[0].pk)
+        Favorites.objects.create(receipt=recipe, user=self.users[1])
+        recipe.name = 'renamed'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_save_of_deferred_or_missing_recipe(self):
+        recipe = Receipt.objects.only('pk', 'name').get(
+            pk=self.recipes[0].pk)
+        recipe.name = 'renamed'
+        # Отложенные поля не подгружаются: один UPDATE.
+        with self.assertNumQueries(1):
+            recipe.save()
+        recipe = Receipt.objects.get(pk=self.recipes[1].pk)
+        Receipt.objects.filter(pk=recipe.pk).delete()
+        recipe.save()
+        self.assertTrue(Receipt.objects.filter(pk=recipe.pk).exists())
+
+    def test_ordering_by_favorites_count(self):
+        for count, recipe in zip((1, 3, 2), self.recipes):
+            for user in self.users[:count]:
+                Favorites.objects.create(receipt=recipe, user=user)
+        response = APIClient().get(
+            RECIPES_URL, {'ordering': '-favorites_count'})
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['recipe 1', 'recipe 2', 'recipe 0']
+        )
+
+    def test_reconcile_fixes_drift(self):
+        Favorites.objects.bulk_create(
+            Favorites(receipt=self.recipes[0], user=user)
+            for user in self.users
+        )
+        Receipt.objects.filter(pk=self.recipes[1].pk).update(
+            in_carts_count=5)
+        call_command('reconcile_counters', batch_size=2, stdout=StringIO())
+        counts = dict(Receipt.objects.values_list(
+            'pk', 'favorites_count'))
+        self.assertEqual(counts[self.recipes[0].pk], 3)
+        self.assertEqual(
+            Receipt.objects.get(pk=self.recipes[1].pk).in_carts_count, 0)
+
+
+class RecipeCursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@test.local')
+        for index in range(7):
+            Receipt.objects.create(
+                author=author,
+                name='recipe {0}'.format(index),
+                text='text',
+                image='receipts/test.png',
+                cooking_time=10
+            )
+        # Одинаковая дата у части рецептов: порядок решает id.
+        same_date = Receipt.objects.get(name='recipe 2').pub_date
+        Receipt.objects.filter(
+            name__in=('recipe 2', 'recipe 3', 'recipe 4')
+        ).update(pub_date=same_date)
+
+    def test_walks_all_recipes_without_count(self):
+        cache.clear()
+        client = APIClient()
+        names = []
+        url, params = RECIPES_URL, {'cursor': '', 'limit': 2}
+        while url:
+            # id страницы, рецепты, ингредиенты, теги - без COUNT(*)
+            with self.assertNumQueries(4):
+                response = client.get(url, params)
+            self.assertNotIn('count', response.data)
+            names += [recipe['name'] for recipe in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(
+            names,
+            list(Receipt.objects.order_by('-pub_date', '-id')
+                 .values_list('name', flat=True))
+        )
+
+    def test_invalid_cursor(self):
+        response = APIClient().get(RECIPES_URL, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_mode_is_default(self):
+        response = APIClient().get(RECIPES_URL, {'page': 2, 'limit': 2})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class RecipeTagFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@test.local')
+        cls.tags = {
+            slug: Tag.objects.create(
+                name=slug, color='#00000{0}'.format(index), slug=slug)
+            for index, slug in enumerate(('breakfast', 'lunch', 'dinner'))
+        }
+        for name, slugs in (
+            ('eggs', ('breakfast', )),
+            ('soup', ('lunch', 'dinner')),
+            ('porridge', ('breakfast', 'lunch')),
+            ('tea', ()),
+        ):
+            recipe = Receipt.objects.create(
+                author=author,
+                name=name,
+                text='text',
+                image='receipts/test.png',
+                cooking_time=10
+            )
+            for slug in slugs:
+                AttachedTag.objects.create(
+                    receipt=recipe, tag=cls.tags[slug])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_names(self, params):
+        response = APIClient().get(RECIPES_URL, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['count'], len(response.data['results']))
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def test_any_of_tags(self):
+        self.assertEqual(
+            self.get_names({'tags': ['breakfast', 'lunch']}),
+            {'eggs', 'soup', 'porridge'}
+        )
+        self.assertEqual(self.get_names({'tags': 'breakfast,dinner'}),
+                         {'eggs', 'soup', 'porridge'})
+        self.assertEqual(self.get_names({'tags': ['lunch', 'unknown']}),
+                         {'soup', 'porridge'})
+        self.assertEqual(self.get_names({'tags': 'unknown'}), set())
+        self.assertEqual(len(self.get_names({})), 4)
+
+    def test_all_of_tags(self):
+        params = {'tags': ['breakfast', 'lunch'], 'tags_mode': 'all'}
+        self.assertEqual(self.get_names(params), {'porridge'})
+        params['tags'].append('unknown')
+        self.assertEqual(self.get_names(params), set())
+
+    def test_invalid_mode(self):
+        response = APIClient().get(
+            RECIPES_URL, {'tags': 'lunch', 'tags_mode': 'some'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeUserFlagFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@test.local')
+        cls.recipes = {}
+        for name in ('favorite', 'in cart', 'both', 'none'):
+            cls.recipes[name] = Receipt.objects.create(
+                author=cls.user,
+                name=name,
+                text='text',
+                image='receipts/test.png',
+                cooking_time=10
+            )
+        for name in ('favorite', 'both'):
+            Favorites.objects.create(
+                receipt=cls.recipes[name], user=cls.user)
+        for name in ('in cart', 'both'):
+            ShoppingCart.objects.create(
+                receipt=cls.recipes[name], user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_results(self, params):
+        response = self.client.get(RECIPES_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return {
+            recipe['name']: recipe for recipe in response.data['results']
+        }
+
+    def test_filters_match_flags(self):
+        for flag in ('is_favorited', 'is_in_shopping_cart'):
+            for value in (0, 1):
+                with self.subTest(flag=flag, value=value):
+                    results = self.get_results({flag: value})
+                    self.assertEqual(len(results), 2)
+                    for recipe in results.values():
+                        self.assertEqual(recipe[flag], bool(value))
+
+    def test_shopping_cart_zero_keeps_favorites(self):
+        self.assertEqual(
+            set(self.get_results({'is_in_shopping_cart': 0})),
+            {'favorite', 'none'}
+        )
+
+    def test_combined_filters(self):
+        self.assertEqual(
+            set(self.get_results({
+                'is_favorited': 1, 'is_in_shopping_cart': 0
+            })),
+            {'favorite'}
+        )
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get_results({'is_favorited': 1}), {})
+        self.assertEqual(
+            len(self.get_results({'is_in_shopping_cart': 0})), 4)
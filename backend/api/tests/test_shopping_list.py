@@ -0,0 +1,127 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from receipts.models import (AttachedIngredient, Ingredient, Receipt,
+                             ShoppingCart)
+from rest_framework.test import APIClient
+
+from ..exporters import BaseExporter, PDFExporter
+from ..services import get_shopping_list
+
+User = get_user_model()
+
+
+class ShoppingCartTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@test.local')
+        cls.salt_g = Ingredient.objects.create(
+            name='salt', measurement_unit='g')
+        cls.salt_pinch = Ingredient.objects.create(
+            name='salt', measurement_unit='pinch')
+        cls.recipes = [
+            Receipt.objects.create(
+                author=cls.user,
+                name='recipe {0}'.format(index),
+                text='text',
+                image='receipts/test.png',
+                cooking_time=10
+            )
+            for index in range(3)
+        ]
+        for recipe in cls.recipes:
+            AttachedIngredient.objects.create(
+                receipt=recipe, ingredient=cls.salt_g, amount=10)
+            AttachedIngredient.objects.create(
+                receipt=recipe, ingredient=cls.salt_pinch, amount=1)
+
+
+class ShoppingListTest(ShoppingCartTestCase):
+    def test_amounts_summed_per_measurement_unit(self):
+        for recipe in self.recipes:
+            ShoppingCart.objects.create(user=self.user, receipt=recipe)
+        shopping_list = {
+            item['ingredient__measurement_unit']: item['total_amount']
+            for item in get_shopping_list(self.user)
+        }
+        self.assertEqual(shopping_list, {'g': 30, 'pinch': 3})
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        ShoppingCart.objects.create(user=self.user, receipt=self.recipes[0])
+        with self.assertNumQueries(1):
+            list(get_shopping_list(self.user))
+        for recipe in self.recipes[1:]:
+            ShoppingCart.objects.create(user=self.user, receipt=recipe)
+        with self.assertNumQueries(1):
+            list(get_shopping_list(self.user))
+
+
+class DownloadShoppingCartTest(ShoppingCartTestCase):
+    def setUp(self):
+        ShoppingCart.objects.create(user=self.user, receipt=self.recipes[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, export_format):
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            {'format': export_format}
+        )
+
+    def test_text_export_is_default(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            'salt (g) — 10\nsalt (pinch) — 1\n'
+        )
+
+    def test_csv_export(self):
+        response = self.download('csv')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines(),
+            ['name,measurement_unit,amount', 'salt,g,10', 'salt,pinch,1']
+        )
+
+    def test_json_export(self):
+        response = self.download('json')
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            [
+                {'id': self.salt_g.id, 'name': 'salt',
+                 'measurement_unit': 'g', 'amount': 10},
+                {'id': self.salt_pinch.id, 'name': 'salt',
+                 'measurement_unit': 'pinch', 'amount': 1},
+            ]
+        )
+
+    def test_pdf_export(self):
+        response = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF')
+        )
+
+    def test_pdf_lines_are_capped(self):
+        items = [
+            {
+                'ingredient__name': 'item {0}'.format(index),
+                'ingredient__measurement_unit': 'g',
+                'total_amount': index,
+            }
+            for index in range(5)
+        ]
+        with override_settings(SHOPPING_LIST_PDF_MAX_LINES=3):
+            lines = list(PDFExporter(iter(items)).lines())
+        self.assertEqual(lines[:3], [
+            'item 0 (g) — 0', 'item 1 (g) — 1', 'item 2 (g) — 2'])
+        self.assertEqual(lines[3:], ['… и ещё 2'])
+
+    def test_exporters_implement_stream(self):
+        with self.assertRaises(TypeError):
+            BaseExporter([])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.download('xml').status_code, 400)
@@ -0,0 +1,117 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+from receipts.models import (AttachedIngredient, AttachedTag, Ingredient,
+                             Receipt, SimilarRecipe, Tag)
+from rest_framework.test import APIClient
+
+from .. import similar
+
+User = get_user_model()
+
+
+class SimilarRecipesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@test.local')
+        ingredients = {
+            name: Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('egg', 'salt', 'milk', 'flour', 'sugar')
+        }
+        tags = {
+            slug: Tag.objects.create(
+                name=slug, color='#00000{0}'.format(index), slug=slug)
+            for index, slug in enumerate(('breakfast', 'dessert'))
+        }
+        cls.recipes = {}
+        for name, names, slugs in (
+            ('omelette', ('egg', 'salt', 'milk'), ('breakfast', )),
+            ('scramble', ('egg', 'salt'), ('breakfast', )),
+            ('boiled egg', ('egg', ), ()),
+            ('cake', ('flour', 'sugar'), ('dessert', )),
+            ('water', (), ()),
+        ):
+            recipe = Receipt.objects.create(
+                author=author,
+                name=name,
+                text='text',
+                image='receipts/test.png',
+                cooking_time=10
+            )
+            for ingredient in names:
+                AttachedIngredient.objects.create(
+                    receipt=recipe, ingredient=ingredients[ingredient],
+                    amount=1)
+            for slug in slugs:
+                AttachedTag.objects.create(receipt=recipe, tag=tags[slug])
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        cache.clear()
+
+    def build(self, *args):
+        output = StringIO()
+        call_command('build_similar_recipes', *args, stdout=output)
+        return output.getvalue()
+
+    def get_names(self, name):
+        url = '/api/recipes/{0}/similar/'.format(self.recipes[name].pk)
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data]
+
+    def test_neighbours_by_shared_ingredients_and_tags(self):
+        self.assertIn('for 5 recipes', self.build())
+        self.assertEqual(
+            self.get_names('omelette'), ['scramble', 'boiled egg'])
+        self.assertEqual(
+            self.get_names('boiled egg'), ['scramble', 'omelette'])
+        self.assertEqual(self.get_names('cake'), [])
+        self.assertEqual(self.get_names('water'), [])
+
+    def test_incremental_rebuild(self):
+        self.build()
+        self.assertIn('for 0 recipes', self.build())
+        cake = self.recipes['cake']
+        AttachedIngredient.objects.create(
+            receipt=cake, ingredient=Ingredient.objects.get(name='egg'),
+            amount=1)
+        Receipt.objects.filter(pk=cake.pk).update(similar_ready=False)
+        self.assertIn('for 1 recipes', self.build())
+        self.assertIn('omelette', self.get_names('cake'))
+        self.assertIn('for 5 recipes', self.build('--all'))
+
+    def test_edit_during_build_stays_pending(self):
+        cake = self.recipes['cake']
+        load_vectors = similar.load_vectors
+
+        def edit_then_load():
+            # Правка рецепта после выборки версий, но до расчёта.
+            Receipt.objects.filter(pk=cake.pk).update(
+                similar_ready=False, similar_version=F('similar_version') + 1)
+            return load_vectors()
+
+        with mock.patch.object(similar, 'load_vectors', edit_then_load):
+            self.assertIn('for 5 recipes', self.build())
+        self.assertEqual(
+            list(Receipt.objects.filter(similar_ready=False).values_list(
+                'pk', flat=True)),
+            [cake.pk])
+        self.assertIn('for 1 recipes', self.build())
+
+    def test_single_query_and_unknown_recipe(self):
+        self.build()
+        self.get_names('omelette')
+        url = '/api/recipes/{0}/similar/'.format(self.recipes['omelette'].pk)
+        with self.assertNumQueries(1):
+            APIClient().get(url)
+        self.assertEqual(
+            APIClient().get('/api/recipes/0/similar/').status_code, 404)
+        self.assertFalse(SimilarRecipe.objects.filter(
+            receipt=self.recipes['water']).exists())
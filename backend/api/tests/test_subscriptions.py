@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from receipts.models import Receipt
+from rest_framework.test import APIClient
+from users.models import Subscribe
+
+User = get_user_model()
+
+SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+
+
+class SubscriptionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='follower', email='follower@test.local')
+        for index in range(3):
+            author = User.objects.create_user(
+                username='author{0}'.format(index),
+                email='author{0}@test.local'.format(index)
+            )
+            Subscribe.objects.create(author=author, subscriber=cls.user)
+            for number in range(index + 2):
+                Receipt.objects.create(
+                    author=author,
+                    name='recipe {0}-{1}'.format(index, number),
+                    text='text',
+                    image='receipts/test.png',
+                    cooking_time=10
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_recipes_limited_per_author(self):
+        response = self.client.get(SUBSCRIPTIONS_URL, {'recipes_limit': 2})
+        self.assertEqual(response.status_code, 200)
+        for index, author in enumerate(response.data['results']):
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], index + 2)
+            self.assertEqual(len(author['recipes']), 2)
+        latest = Receipt.objects.filter(author__username='author2').first()
+        self.assertEqual(
+            response.data['results'][2]['recipes'][0]['id'], latest.id)
+
+    def follow_authors(self, user, count):
+        for index in range(count):
+            author = User.objects.create_user(
+                username='{0}-author{1}'.format(user.username, index),
+                email='{0}-author{1}@test.local'.format(user.username, index)
+            )
+            Subscribe.objects.create(author=author, subscriber=user)
+            for number in range(3):
+                Receipt.objects.create(
+                    author=author,
+                    name='recipe {0}'.format(number),
+                    text='text',
+                    image='receipts/test.png',
+                    cooking_time=10
+                )
+
+    def test_query_count_does_not_depend_on_follow_count(self):
+        counts = []
+        for count in (3, 30):
+            user = User.objects.create_user(
+                username='reader{0}'.format(count),
+                email='reader{0}@test.local'.format(count)
+            )
+            self.follow_authors(user, count)
+            self.client.force_authenticate(user)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    SUBSCRIPTIONS_URL, {'limit': count})
+            self.assertEqual(len(response.data['results']), count)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_recipes_limit(self):
+        for value in ('0', '-1', 'abc'):
+            response = self.client.get(
+                SUBSCRIPTIONS_URL, {'recipes_limit': value})
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(SUBSCRIPTION_RECIPES_LIMIT_MAX=1)
+    def test_recipes_limit_is_capped(self):
+        response = self.client.get(SUBSCRIPTIONS_URL, {'recipes_limit': 100})
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), 1)
@@ -1,24 +1,42 @@
 import logging
+from collections import OrderedDict
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from receipts.models import (AttachedIngredient, Favorites, Ingredient,
-                             Receipt, ShoppingCart, Tag)
-from rest_framework import filters, status, viewsets
+from receipts.models import (COUNTER_FIELDS, Favorites, Ingredient, Receipt,
+                             ShoppingCart, SimilarRecipe, Tag)
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from users.models import Subscribe, User
 
-from .filters import RecipeFilterSet
-from .mixins import ListCreateRetrieveViewSet
+from .caching import (BODIES_VERSION, COUNTERS_VERSION, recipe_version_name,
+                      user_version_name)
+from .exporters import EXPORTERS, TextExporter
+from .feed import get_feed
+from .filters import RecipeFilterSet, RecipeOrderingFilter
+from .ingredient_index import ingredient_index
+from .mixins import ConditionalGetMixin, ListCreateRetrieveViewSet
+from .pagination import RecipePagination, decode_cursor, encode_cursor
+from .parsers import MultiPartJSONParser
 from .permissions import Subscribepermission, UserPermission
+from .recipe_cache import RecipeCache
+from .recipe_io import RecipeImporter, export_recipes
+from .reference_cache import ingredient_cache, tag_cache
 from .serializers import (IngredientSerializer, PasswordChangeSerializer,
-                          RecipeSerializer, SignupSerializer,
-                          SubscribeUserSerializer, TagSerializer,
-                          UserManageSerializer)
+                          RecipeSerializer, RecipesLimitSerializer,
+                          SignupSerializer, SubscribeUserSerializer,
+                          TagSerializer, UserManageSerializer)
+from .services import (fuzzy_search_ingredients, get_shopping_list,
+                       get_subscriptions, with_recipe_previews)
 
 logger = logging.getLogger(__name__)
 
@@ -38,46 +56,51 @@ class UserViewSet(ListCreateRetrieveViewSet):
             permission_classes=[IsAuthenticated, ])
     def me(self, request):
         """Возвращает профиль текущего пользователя."""
-        user = User.objects.get(id=request.user.id)
+        user = request.user
         serializer = UserManageSerializer(user, context={'request': request})
         return Response(serializer.data)
 
-    @action(detail=False, methods=['POST', ])
+    @action(detail=False,
+            methods=['POST', ],
+            permission_classes=[IsAuthenticated, ])
     def set_password(self, request):
         """Смена пароля."""
-        user = User.objects.get(id=request.user.id)
+        user = request.user
         serializer = PasswordChangeSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
             current_password = serializer.validated_data['current_password']
             new_password = serializer.validated_data['new_password']
             if user.check_password(current_password):
                 user.set_password(new_password)
-                user.save()
+                user.save(update_fields=['password'])
                 return Response(status=status.HTTP_204_NO_CONTENT)
         return Response('field error', status=status.HTTP_400_BAD_REQUEST)
 
+    def get_recipes_limit(self, request):
+        serializer = RecipesLimitSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes_limit']
+
     @action(detail=False,
             methods=['GET', ],
             permission_classes=(Subscribepermission, ))
     def subscriptions(self, request):
         """Возвращает подписки текущего пользователя."""
-        user = User.objects.get(id=request.user.id)
-        subscriptions = Subscribe.objects.filter(subscriber=user)
-        list_of_id = []
-        for sub in subscriptions:
-            list_of_id.append(sub.author.id)
-        queryset = User.objects.filter(id__in=list_of_id)
+        user = request.user
+        recipes_limit = self.get_recipes_limit(request)
+        queryset = get_subscriptions(user, recipes_limit)
+        context = {'request': request, 'recipes_limit': recipes_limit}
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = SubscribeUserSerializer(
                 page,
                 many=True,
-                context={'request': request})
+                context=context)
             return self.get_paginated_response(serializer.data)
         serializer = SubscribeUserSerializer(
             queryset,
             many=True,
-            context={'request': request})
+            context=context)
         return Response(serializer.data)
 
     @action(detail=True,
@@ -88,144 +111,302 @@ class UserViewSet(ListCreateRetrieveViewSet):
         logger.info('trying to subscribe')
         author = self.get_object()
         logger.info(f'got an author, {author}')
-        user = User.objects.get(id=request.user.id)
+        user = request.user
         logger.info(f'got a user {user}')
         if request.method == 'POST':
-            if (
-                Subscribe.objects.filter(
-                    author=author,
-                    subscriber=user
-                ).exists()
-                or author == user
-            ):
+            recipes_limit = self.get_recipes_limit(request)
+            if author == user:
                 return Response('Can\'t subscribe',
                                 status=status.HTTP_400_BAD_REQUEST)
             logger.info('trying to create subscribe object')
-            Subscribe.objects.create(author=author, subscriber=user)
+            try:
+                with transaction.atomic():
+                    Subscribe.objects.create(author=author, subscriber=user)
+            except IntegrityError:
+                return Response('Can\'t subscribe',
+                                status=status.HTTP_400_BAD_REQUEST)
             logger.info('sub object created, serializin author')
+            author = with_recipe_previews(
+                User.objects.filter(pk=author.pk), recipes_limit
+            ).get()
             serializer = SubscribeUserSerializer(
-                author, context={'request': request})
+                author,
+                context={'request': request, 'recipes_limit': recipes_limit})
             logger.info('author serialized')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            logger.info('trying to get subscribe object')
-            try:
-                subscribe = Subscribe.objects.get(
-                    author=author, subscriber=user
-                )
-            except (ObjectDoesNotExist):
+            logger.info('trying to delete subscribe object')
+            deleted, _ = Subscribe.objects.filter(
+                author=author, subscriber=user
+            ).delete()
+            if not deleted:
                 return Response(
                     'Object does not exist', status=status.HTTP_400_BAD_REQUEST
                 )
-            logger.info('trying to delete object')
-            subscribe.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Receipt.objects.all()
     serializer_class = RecipeSerializer
-    filter_backends = (DjangoFilterBackend, )
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filter_class = RecipeFilterSet
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
+    pagination_class = RecipePagination
+    parser_classes = (JSONParser, MultiPartJSONParser)
     permission_classes = (IsAuthenticatedOrReadOnly, )
 
-    @action(detail=True, methods=['POST', 'DELETE'])
-    def favorite(self, request, pk=None):
-        """Позволяет добавить или удалить рецепт из избранного."""
+    def get_queryset(self):
+        if self.action == 'list':
+            # Тела рецептов собирает RecipeCache, здесь нужны только
+            # id страницы и поле для курсора.
+            return Receipt.objects.only('id', 'pub_date')
+        return (
+            Receipt.objects
+            .with_related()
+            .with_user_flags(self.request.user)
+        )
+
+    def get_version_names(self):
+        if self.action == 'retrieve':
+            # /recipes/01/ и /recipes/1/ - один рецепт и одна версия;
+            # для нечислового id retrieve ответит 404.
+            try:
+                pk = int(self.kwargs[self.lookup_field])
+            except ValueError:
+                pk = None
+            names = [recipe_version_name(pk)]
+        else:
+            names = ['recipes']
+            ordering = self.request.query_params.get('ordering', '')
+            if any(
+                field.strip().lstrip('-') in COUNTER_FIELDS
+                for field in ordering.split(',')
+            ):
+                names.append(COUNTERS_VERSION)
+        names.append(BODIES_VERSION)
+        if not self.request.user.is_anonymous:
+            names.append(user_version_name(self.request.user.pk))
+        return names
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        data = RecipeCache(request).render([recipe.pk for recipe in page])
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+        data = RecipeCache(request).render([pk])
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+    def perform_save(self, serializer):
+        recipe = serializer.save()
+        # Ответ строится по рецепту с подгруженными связями и флагами,
+        # а не по ленивым связям только что сохранённого объекта.
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_create(self, serializer):
+        self.perform_save(serializer)
+
+    def perform_update(self, serializer):
+        self.perform_save(serializer)
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= выбирает формат файла со списком покупок,
+        # а не рендерер DRF.
+        if self.action == 'download_shopping_cart':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
+    def add_or_remove(self, request, model, flag):
+        """Добавляет рецепт в список пользователя (избранное, корзину)
+        или удаляет из него. Повторное добавление отсекается
+        уникальным ограничением, а не отдельным запросом на проверку."""
         recipe = self.get_object()
-        user = User.objects.get(id=request.user.id)
+        user = request.user
         if request.method == 'POST':
-            if Favorites.objects.filter(receipt=recipe, user=user).exists():
+            try:
+                with transaction.atomic():
+                    model.objects.create(receipt=recipe, user=user)
+            except IntegrityError:
                 return Response('Already exists',
                                 status=status.HTTP_400_BAD_REQUEST)
-            else:
-                Favorites.objects.create(receipt=recipe, user=user)
-                serializer = RecipeSerializer(
-                    recipe,
-                    context={'request': request}
-                )
-                return Response(
-                    serializer.data, status=status.HTTP_201_CREATED
-                )
-        else:
-            try:
-                favorite = Favorites.objects.get(receipt=recipe, user=user)
-            except (ObjectDoesNotExist):
-                return Response(
-                    'Object does not exist', status=status.HTTP_400_BAD_REQUEST
-                )
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            setattr(recipe, flag, True)
+            serializer = RecipeSerializer(
+                recipe,
+                context={'request': request}
+            )
+            return Response(
+                serializer.data, status=status.HTTP_201_CREATED
+            )
+        deleted, _ = model.objects.filter(receipt=recipe, user=user).delete()
+        if not deleted:
+            return Response(
+                'Object does not exist', status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['POST', 'DELETE'])
+    def favorite(self, request, pk=None):
+        """Позволяет добавить или удалить рецепт из избранного."""
+        return self.add_or_remove(request, Favorites, 'is_favorited')
 
     @action(detail=True, methods=['POST', 'DELETE'])
     def shopping_cart(self, request, pk=None):
         """Позволяет добавить или удалить рецепт из корзины."""
-        recipe = self.get_object()
-        user = User.objects.get(id=request.user.id)
-        if request.method == 'POST':
-            if ShoppingCart.objects.filter(receipt=recipe, user=user).exists():
-                return Response('Already exists',
-                                status=status.HTTP_400_BAD_REQUEST)
-            else:
-                ShoppingCart.objects.create(receipt=recipe, user=user)
-                serializer = RecipeSerializer(
-                    recipe,
-                    context={'request': request}
-                )
-                return Response(
-                    serializer.data, status=status.HTTP_201_CREATED
-                )
-        else:
-            try:
-                favorite = ShoppingCart.objects.get(receipt=recipe, user=user)
-            except (ObjectDoesNotExist):
-                return Response(
-                    'Object does not exist', status=status.HTTP_400_BAD_REQUEST
-                )
-            favorite.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.add_or_remove(request, ShoppingCart, 'is_in_shopping_cart')
+
+    @action(detail=True, methods=['GET', ])
+    def similar(self, request, pk=None):
+        """Похожие по ингредиентам и тегам рецепты из индекса,
+        который строит команда build_similar_recipes."""
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        ids = list(
+            SimilarRecipe.objects.filter(receipt_id=pk).order_by('rank')
+            .values_list('similar_id', flat=True)
+        )
+        if not ids and not Receipt.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(RecipeCache(request).render(ids))
+
+    @action(detail=False,
+            methods=['GET', ],
+            permission_classes=[IsAuthenticated, ])
+    def feed(self, request):
+        """Лента новых рецептов авторов, на которых подписан
+        пользователь. Листается только курсором: ?cursor=&limit=."""
+        cursor_param = self.paginator.cursor_query_param
+        position = None
+        cursor = request.query_params.get(cursor_param)
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None or position[0] is None:
+                raise NotFound(self.paginator.invalid_cursor_message)
+        ids, next_position = get_feed(
+            request.user, position, self.paginator.get_page_size(request))
+        next_link = None
+        if next_position is not None:
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                cursor_param,
+                encode_cursor(*next_position)
+            )
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('results', RecipeCache(request).render(ids)),
+        ]))
+
+    @action(detail=False,
+            methods=['GET', ],
+            permission_classes=[IsAdminUser, ])
+    def export(self, request):
+        """Выгружает все рецепты в формате NDJSON."""
+        response = StreamingHttpResponse(
+            export_recipes(), content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename=recipes.ndjson'
+        )
+        return response
+
+    @action(detail=False,
+            methods=['POST', ],
+            url_path='import',
+            permission_classes=[IsAdminUser, ])
+    def import_recipes(self, request):
+        """Импортирует рецепты из тела запроса в формате NDJSON."""
+        user = request.user
+        importer = RecipeImporter(author=user).run(request.stream or ())
+        return Response(
+            {
+                'created': importer.created,
+                'errors': [
+                    {'line': number, 'errors': errors}
+                    for number, errors in importer.errors
+                ],
+            },
+            status=status.HTTP_200_OK
+        )
 
     @action(detail=False,
             methods=['GET', ],
             permission_classes=[IsAuthenticated, ])
     def download_shopping_cart(self, request):
         """Позволяет скачать лист покупок."""
-        user = User.objects.get(id=request.user.id)
-        queryset = ShoppingCart.objects.filter(user=user)
-        shopping_list = {}
-        for query in queryset:
-            recipe = query.receipt
-            for ingredient in recipe.ingredients.all():
-                name = ingredient.name
-                ingredient_amount = AttachedIngredient.objects.get(
-                    receipt=recipe, ingredient=ingredient)
-                amount = ingredient_amount.amount
-                if name in shopping_list:
-                    shopping_list[name] += amount
-                else:
-                    shopping_list[name] = amount
-        content = str()
-        for key in shopping_list:
-            content += key + ': ' + str(shopping_list[key]) + ', '
-        filename = 'shopping_list.txt'
-        response = HttpResponse(content=content, content_type='text/plain')
+        user = request.user
+        exporter_class = EXPORTERS.get(
+            request.query_params.get('format', TextExporter.extension)
+        )
+        if exporter_class is None:
+            return Response('Unknown format',
+                            status=status.HTTP_400_BAD_REQUEST)
+        exporter = exporter_class(get_shopping_list(user).iterator())
+        response = StreamingHttpResponse(
+            exporter.stream(), content_type=exporter.content_type
+        )
         response['Content-Disposition'] = (
-            'attachment; filename={0}'.format(filename)
+            'attachment; filename={0}'.format(exporter.filename)
         )
         return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+def get_from_reference_cache(reference_cache, pk):
+    try:
+        obj = reference_cache.get(int(pk))
+    except ValueError:
+        obj = None
+    if obj is None:
+        raise Http404
+    return obj
+
+
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = ()
+    cache_max_age = settings.REFERENCE_CACHE_MAX_AGE
+
+    def get_version_names(self):
+        return ['tags']
+
+    def list(self, request, *args, **kwargs):
+        return Response(tag_cache.serialized(self.get_serializer_class()))
 
+    def get_object(self):
+        return get_from_reference_cache(tag_cache, self.kwargs['pk'])
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = ()
-    filter_backends = (filters.SearchFilter, )
-    search_fields = ('^name', )
+    cache_max_age = settings.REFERENCE_CACHE_MAX_AGE
+
+    def get_version_names(self):
+        return ['ingredients']
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по началу названия обслуживается из индекса в памяти."""
+        name = request.query_params.get(api_settings.SEARCH_PARAM)
+        if name:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+            return Response(
+                ingredient_index.search(name, limit)
+                or fuzzy_search_ingredients(name, limit)
+            )
+        return Response(
+            ingredient_cache.serialized(self.get_serializer_class()))
+
+    def get_object(self):
+        return get_from_reference_cache(ingredient_cache, self.kwargs['pk'])
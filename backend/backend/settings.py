@@ -17,6 +17,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,7 +82,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'api.pagination.StandardResultsSetPagination',
@@ -164,3 +166,114 @@ LOGGING = {
         }
     },
 }
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+SHOPPING_LIST_SPOOL_SIZE = 1024 * 1024
+# PDF собирается в памяти целиком, см. api.exporters.PDFExporter.
+SHOPPING_LIST_PDF_MAX_LINES = 2000
+
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 300
+
+CACHES = {
+    'default': {
+        # В продакшене - общий для всех процессов бэкенд, например
+        # django.core.cache.backends.memcached.PyLibMCCache
+        # или django_redis.cache.RedisCache.
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Перезагрузка тегов и ингредиентов в памяти процесса,
+# см. api.reference_cache.
+REFERENCE_CACHE_TTL = 60 * 60
+
+# Cache-Control: max-age для тегов и ингредиентов.
+REFERENCE_CACHE_MAX_AGE = 60 * 60
+
+# Максимальный размер картинки рецепта после декодирования base64
+# и порог, после которого декодированная картинка пишется на диск,
+# см. api.fields.
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 5 * 1024 * 1024))
+IMAGE_SPOOL_SIZE = 1024 * 1024
+# JSON с картинкой в base64 больше картинки примерно на треть.
+DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_IMAGE_SIZE * 4 // 3 + 1024 * 1024
+# Картинка из multipart пишется на диск с того же порога.
+FILE_UPLOAD_MAX_MEMORY_SIZE = IMAGE_SPOOL_SIZE
+
+# Уменьшенные копии картинок рецептов: размер -> длинная сторона
+# в пикселях, см. api.images. IMAGE_WORKERS = 0 - обработка без пула.
+RECIPE_IMAGE_SIZES = {
+    'small': 200,
+    'medium': 600,
+}
+RECIPE_IMAGE_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Время жизни токена с пользователем в кэше,
+# см. api.authentication.CachedTokenAuthentication.
+AUTH_TOKEN_CACHE_TTL = 5 * 60
+
+# Лента подписок, см. api.feed: авторы с числом подписчиков больше
+# порога не разносятся по лентам, а подмешиваются при чтении.
+FEED_FANOUT_THRESHOLD = 10000
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_SIZE = 100
+FEED_MAX_ENTRIES = 1000
+FEED_AUTHORS_TTL = 5 * 60
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', 1))
+
+# Похожие рецепты, см. api.similar.
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_TAG_WEIGHT = 0.5
+SIMILAR_BATCH_SIZE = 200
+
+# Время жизни тел рецептов и флагов пользователя, см. api.recipe_cache.
+RECIPE_CACHE_TTL = 60 * 60
+
+# Кэш количества объектов в списках, см. api.pagination.
+COUNT_CACHE_TTL = 60
+COUNT_ESTIMATE_THRESHOLD = 100000
+
+SUBSCRIPTION_RECIPES_LIMIT = 10
+SUBSCRIPTION_RECIPES_LIMIT_MAX = 50
+
+# Бюджет SQL-запросов на эндпоинт (по имени маршрута роутера),
+# см. api.middleware.QueryCountMiddleware.
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGETS = {
+    # Холодный кэш: count, страница id и три запроса на тела рецептов.
+    'recipes-list': 6,
+    'recipes-detail': 4,
+    'tags-list': 2,
+    'tags-detail': 2,
+    'ingredients-list': 2,
+    'ingredients-detail': 2,
+    'users-me': 2,
+    'users-subscriptions': 4,
+    # Изменяющие маршруты считаются с холодным кэшем токенов.
+    'POST users-list': 4,
+    'POST users-set-password': 3,
+    'POST users-subscribe': 10,
+    'DELETE users-subscribe': 6,
+    'POST recipes-list': 11,
+    # Правка с удалением и изменением тегов и ингредиентов.
+    'PUT recipes-detail': 19,
+    'PATCH recipes-detail': 19,
+    'DELETE recipes-detail': 14,
+    'POST recipes-favorite': 8,
+    'DELETE recipes-favorite': 7,
+    'POST recipes-shopping-cart': 8,
+    'DELETE recipes-shopping-cart': 7,
+    # Импорт трёх строк. На PostgreSQL рецепты пачки вставляются одним
+    # INSERT (7 запросов), на SQLite без RETURNING - по одному, и бюджет
+    # рассчитан на этот случай; более длинный импорт на SQLite его
+    # превысит.
+    'POST recipes-import-recipes': 9,
+}
@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Индекс ингредиентов строится до первого запроса.
+from api.ingredient_index import warm_up  # noqa: E402
+
+warm_up()
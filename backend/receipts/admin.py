@@ -1,5 +1,4 @@
 from django.contrib import admin
-from django.db.models import Count
 
 from .models import (AttachedIngredient, AttachedTag, Favorites, Ingredient,
                      Receipt, ShoppingCart, Tag)
@@ -16,20 +15,11 @@ class AttachedTagAdmin(admin.StackedInline):
 
 
 class ReceiptAdmin(admin.ModelAdmin):
-    list_display = ('author', 'name', 'text', 'favorite_count')
+    list_display = ('author', 'name', 'text', 'favorites_count')
     list_filter = ('author', 'name', 'tags')
+    readonly_fields = ('favorites_count', 'in_carts_count')
     inlines = [AttachedIngredientAdmin, AttachedTagAdmin]
 
-    def favorite_count(self, obj):
-        return obj.favorite_count
-
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(
-            favorite_count=Count('as_favorite', distinct=True)
-        )
-        return queryset
-
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
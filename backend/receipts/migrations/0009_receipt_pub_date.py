@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0008_auto_20230102_2126'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ('id',)},
+        ),
+        migrations.AlterModelOptions(
+            name='receipt',
+            options={'ordering': ('-pub_date',)},
+        ),
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'ordering': ('id',)},
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='дата публикации'),
+            preserve_default=False,
+        ),
+    ]
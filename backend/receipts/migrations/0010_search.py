@@ -0,0 +1,65 @@
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_SQL = [
+    'CREATE INDEX receipts_receipt_name_trgm '
+    'ON receipts_receipt USING gin (name gin_trgm_ops)',
+    'CREATE INDEX receipts_ingredient_name_trgm '
+    'ON receipts_ingredient USING gin (name gin_trgm_ops)',
+    'CREATE INDEX receipts_receipt_search_vector '
+    'ON receipts_receipt USING gin (search_vector)',
+    """
+    CREATE FUNCTION receipts_receipt_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'CREATE TRIGGER receipts_receipt_search_vector_trigger '
+    'BEFORE INSERT OR UPDATE OF name, text ON receipts_receipt '
+    'FOR EACH ROW EXECUTE PROCEDURE receipts_receipt_search_vector_update()',
+    'UPDATE receipts_receipt SET name = name',
+]
+
+DROP_SEARCH_SQL = [
+    'DROP TRIGGER IF EXISTS receipts_receipt_search_vector_trigger '
+    'ON receipts_receipt',
+    'DROP FUNCTION IF EXISTS receipts_receipt_search_vector_update()',
+    'DROP INDEX IF EXISTS receipts_receipt_search_vector',
+    'DROP INDEX IF EXISTS receipts_ingredient_name_trgm',
+    'DROP INDEX IF EXISTS receipts_receipt_name_trgm',
+]
+
+
+def run_on_postgresql(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0009_receipt_pub_date'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='receipt',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='full-text search vector'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(SEARCH_SQL),
+            run_on_postgresql(DROP_SEARCH_SQL)
+        ),
+    ]
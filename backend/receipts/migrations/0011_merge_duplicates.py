@@ -0,0 +1,76 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+# Ограничения уникальности добавляются отдельной миграцией 0012:
+# на PostgreSQL ALTER TABLE в одной транзакции с изменением данных
+# падает с "pending trigger events".
+
+UNIQUE_FIELDS = {
+    'AttachedIngredient': ('receipt', 'ingredient'),
+    'AttachedTag': ('receipt', 'tag'),
+    'Favorites': ('user', 'receipt'),
+    'ShoppingCart': ('user', 'receipt'),
+}
+# Верхняя граница PositiveSmallIntegerField на всех бэкендах.
+MAX_AMOUNT = 32767
+
+
+def get_duplicates(model, fields):
+    return (
+        model.objects
+        .order_by()
+        .values(*fields)
+        .annotate(keep_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Оставляет по одному ингредиенту на (name, measurement_unit),
+    перенося на него ссылки из рецептов."""
+    Ingredient = apps.get_model('receipts', 'Ingredient')
+    AttachedIngredient = apps.get_model('receipts', 'AttachedIngredient')
+    for duplicate in get_duplicates(
+        Ingredient, ('name', 'measurement_unit')
+    ):
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=duplicate['keep_id'])
+        AttachedIngredient.objects.filter(ingredient__in=extra).update(
+            ingredient_id=duplicate['keep_id']
+        )
+        extra.delete()
+
+
+def delete_duplicates(apps, schema_editor):
+    """Удаляет повторные строки, оставляя строку с наименьшим id.
+    Количества повторяющихся ингредиентов рецепта складываются."""
+    for model_name, fields in UNIQUE_FIELDS.items():
+        model = apps.get_model('receipts', model_name)
+        duplicates = get_duplicates(model, fields)
+        if model_name == 'AttachedIngredient':
+            duplicates = duplicates.annotate(total=Sum('amount'))
+        for duplicate in duplicates:
+            rows = model.objects.filter(
+                **{field: duplicate[field] for field in fields})
+            if 'total' in duplicate:
+                rows.filter(id=duplicate['keep_id']).update(
+                    amount=min(duplicate['total'], MAX_AMOUNT))
+            rows.exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0010_search'),
+    ]
+
+    operations = [
+        # Слияние ингредиентов может породить повторы в
+        # AttachedIngredient, поэтому оно идёт первым.
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+    ]
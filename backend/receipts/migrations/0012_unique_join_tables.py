@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0011_merge_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_measurement_unit'),
+        ),
+        migrations.AddIndex(
+            model_name='attachedingredient',
+            index=models.Index(fields=['ingredient', 'receipt'], name='attached_ingredient_rev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attachedtag',
+            index=models.Index(fields=['tag', 'receipt'], name='attached_tag_rev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorites',
+            index=models.Index(fields=['receipt', 'user'], name='favorites_rev_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['receipt', 'user'], name='shopping_cart_rev_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='attachedingredient',
+            constraint=models.UniqueConstraint(fields=('receipt', 'ingredient'), name='unique_attached_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='attachedtag',
+            constraint=models.UniqueConstraint(fields=('receipt', 'tag'), name='unique_attached_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorites',
+            constraint=models.UniqueConstraint(fields=('user', 'receipt'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'receipt'), name='unique_shopping_cart'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = {
+    'favorites_count': 'Favorites',
+    'in_carts_count': 'ShoppingCart',
+}
+
+
+def fill_counters(apps, schema_editor):
+    Receipt = apps.get_model('receipts', 'Receipt')
+    counts = {}
+    for field, model_name in COUNTERS.items():
+        model = apps.get_model('receipts', model_name)
+        counts[field] = Coalesce(Subquery(
+            model.objects
+            .filter(receipt=OuterRef('pk'))
+            .order_by()
+            .values('receipt')
+            .annotate(count=Count('pk'))
+            .values('count')
+        ), 0)
+    Receipt.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0012_unique_join_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='number of users who favorited the receipt'),
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='number of shopping carts with the receipt'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['-favorites_count', '-pub_date'], name='receipt_favorites_count_idx'),
+        ),
+    ]
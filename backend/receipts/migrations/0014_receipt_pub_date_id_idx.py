@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0013_receipt_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['-pub_date', '-id'], name='receipt_pub_date_id_idx'),
+        ),
+    ]
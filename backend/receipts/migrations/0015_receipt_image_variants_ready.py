@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0014_receipt_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='image_variants_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='resized copies of the image are built'),
+        ),
+    ]
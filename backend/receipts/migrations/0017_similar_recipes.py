@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0016_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='similar_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='similar recipes are up to date'),
+        ),
+        migrations.CreateModel(
+            name='SimilarRecipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_recipes', to='receipts.Receipt')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='receipts.Receipt')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='similarrecipe',
+            constraint=models.UniqueConstraint(fields=('receipt', 'rank'), name='unique_similar_recipe_rank'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0017_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='similar_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='version of tags and ingredients'),
+        ),
+    ]
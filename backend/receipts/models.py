@@ -1,9 +1,23 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField,
+                                            TrigramSimilarity)
 from django.core.validators import MinValueValidator
-from django.db import models
-from users.models import User
+from django.db import connections, models, transaction
+from django.db.models import (BooleanField, Case, Count, Exists, F,
+                              IntegerField, OuterRef, Prefetch, Q, Subquery,
+                              Value, When)
+from django.db.models.functions import Greatest
+from users.models import Subscribe, User
 
 from .validators import validate_hex
 
+# Конфигурация полнотекстового поиска PostgreSQL; должна совпадать
+# с конфигурацией в триггере из миграции 0010_search.
+SEARCH_CONFIG = 'russian'
+# Счётчики рецепта меняются только атомарными UPDATE
+# (receipts.signals, CountedRelation), Receipt.save их не пишет.
+COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -41,11 +55,100 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('id', )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_measurement_unit'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class ReceiptQuerySet(models.QuerySet):
+    def with_related(self):
+        """Подгружает автора, ингредиенты и теги фиксированным
+        числом запросов, независимо от количества рецептов.
+        search_vector нужен только поиску и не читается."""
+        return self.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            Prefetch(
+                'attached_ingredients',
+                queryset=AttachedIngredient.objects.select_related(
+                    'ingredient'
+                )
+            ),
+            'tags'
+        )
+
+    @staticmethod
+    def user_flags(user):
+        """Выражения флагов is_favorited, is_in_shopping_cart
+        и is_author_subscribed для текущего пользователя."""
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return {
+                'is_favorited': false,
+                'is_in_shopping_cart': false,
+                'is_author_subscribed': false,
+            }
+        return {
+            'is_favorited': Exists(Favorites.objects.filter(
+                receipt=OuterRef('pk'), user=user
+            )),
+            'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                receipt=OuterRef('pk'), user=user
+            )),
+            'is_author_subscribed': Exists(Subscribe.objects.filter(
+                author=OuterRef('author'), subscriber=user
+            )),
+        }
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги текущего пользователя, см. user_flags."""
+        return self.annotate(**self.user_flags(user))
+
+    def filter_by_user_flag(self, flag, value, user):
+        """Рецепты, у которых флаг пользователя flag равен value.
+
+        Условие - тот же EXISTS, что и у with_user_flags, поэтому
+        флаг в ответе и фильтр считаются одинаково. У анонимного
+        пользователя все флаги ложны.
+        """
+        if user.is_anonymous:
+            return self.none() if value else self
+        return self.annotate(
+            **{flag: self.user_flags(user)[flag]}
+        ).filter(**{flag: value})
+
+    def search(self, value):
+        """Поиск по названию и описанию, отсортированный по релевантности.
+
+        На PostgreSQL использует полнотекстовый поиск по search_vector
+        и триграммное сходство названия (оба покрыты GIN-индексами),
+        на остальных СУБД - переносимый поиск по вхождению подстроки.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            query = SearchQuery(value, config=SEARCH_CONFIG)
+            return self.annotate(
+                search_rank=SearchRank(F('search_vector'), query),
+                similarity=TrigramSimilarity('name', value)
+            ).filter(
+                Q(search_vector=query) | Q(name__trigram_similar=value)
+            ).order_by('-search_rank', '-similarity', '-pub_date')
+        return self.annotate(
+            search_rank=Case(
+                When(name__istartswith=value, then=Value(3)),
+                When(name__icontains=value, then=Value(2)),
+                When(text__icontains=value, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        ).filter(search_rank__gt=0).order_by('-search_rank', '-pub_date')
+
+
 class Receipt(models.Model):
     author = models.ForeignKey(
         User,
@@ -67,6 +170,21 @@ class Receipt(models.Model):
         verbose_name='image of the receipt',
         upload_to='receipts/'
     )
+    image_variants_ready = models.BooleanField(
+        verbose_name='resized copies of the image are built',
+        default=False,
+        editable=False
+    )
+    similar_ready = models.BooleanField(
+        verbose_name='similar recipes are up to date',
+        default=False,
+        editable=False
+    )
+    similar_version = models.PositiveIntegerField(
+        verbose_name='version of tags and ingredients',
+        default=0,
+        editable=False
+    )
     text = models.TextField(
         verbose_name='text description',
     )
@@ -83,13 +201,133 @@ class Receipt(models.Model):
     cooking_time = models.IntegerField(
         verbose_name='cooking time',
     )
+    search_vector = SearchVectorField(
+        verbose_name='full-text search vector',
+        null=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='number of users who favorited the receipt',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='number of shopping carts with the receipt',
+        default=0,
+        editable=False
+    )
+
+    objects = ReceiptQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='receipt_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date'),
+                name='receipt_favorites_count_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Имя картинки в БД, чтобы save заметил её замену.
+        if 'image' in field_names:
+            instance._stored_image = values[field_names.index('image')]
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Полное сохранение не перезаписывает у существующего рецепта
+        счётчики, флаг image_variants_ready и состояние похожих
+        рецептов: их меняют другие запросы и фоновые обработчики.
+
+        Если загруженная картинка заменена, флаг копий сбрасывается,
+        а прежнее имя остаётся в replaced_image для post_save.
+        """
+        update_fields = kwargs.get('update_fields')
+        stored = getattr(self, '_stored_image', None)
+        self.replaced_image = None
+        if (
+            stored is not None
+            and (update_fields is None or 'image' in update_fields)
+            and stored != self.image.name
+        ):
+            self.replaced_image = stored
+            self.image_variants_ready = False
+            if update_fields is not None:
+                kwargs['update_fields'] = (
+                    list(update_fields) + ['image_variants_ready'])
+        self._skip_on_update = ()
+        if update_fields is None:
+            self._skip_on_update = COUNTER_FIELDS + (
+                'similar_ready', 'similar_version')
+            if self.replaced_image is None:
+                self._skip_on_update += ('image_variants_ready', )
+        super().save(*args, **kwargs)
+        if 'image' not in self.get_deferred_fields():
+            self._stored_image = self.image.name
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        # Поля пропускаются только в UPDATE: если строки уже нет,
+        # Django вставит её со всеми полями.
+        values = [
+            value for value in values
+            if value[0].name not in self._skip_on_update
+        ]
+        return super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update)
+
+
+class CountedRelationQuerySet(models.QuerySet):
+    def delete(self):
+        """Уменьшает счётчики затронутых рецептов одним UPDATE
+        с подзапросом по удаляемым строкам и удаляет строки."""
+        field = self.model.counter_field
+        removed = Subquery(
+            self.filter(receipt=OuterRef('pk'))
+            .order_by()
+            .values('receipt')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            Receipt.objects.filter(
+                pk__in=self.values('receipt_id')
+            ).update(**{field: Greatest(F(field) - removed, 0)})
+            return super().delete()
+
+
+class CountedRelation(models.Model):
+    """Связь пользователя с рецептом, число которых хранится
+    в поле counter_field рецепта.
+
+    Счётчик увеличивается сигналом post_save, а уменьшается при
+    удалении через модель или QuerySet. Каскадное удаление рецепта
+    счётчик не трогает, а пользователя - уменьшает одним UPDATE
+    (receipts.signals).
+    """
+    counter_field = None
+
+    objects = CountedRelationQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, *args, **kwargs):
+        field = self.counter_field
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            Receipt.objects.filter(pk=self.receipt_id).update(
+                **{field: Greatest(F(field) - 1, 0)})
+            return super().delete(*args, **kwargs)
+
 
 class AttachedIngredient(models.Model):
     ingredient = models.ForeignKey(
@@ -107,6 +345,20 @@ class AttachedIngredient(models.Model):
         validators=(MinValueValidator(1),)
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('receipt', 'ingredient'),
+                name='unique_attached_ingredient'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('ingredient', 'receipt'),
+                name='attached_ingredient_rev_idx'
+            ),
+        )
+
     def __str__(self):
         return '{} ({})'.format(self.ingredient.name, self.receipt.name)
 
@@ -123,11 +375,27 @@ class AttachedTag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('receipt', 'tag'),
+                name='unique_attached_tag'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('tag', 'receipt'),
+                name='attached_tag_rev_idx'
+            ),
+        )
+
     def __str__(self):
         return '{} ({})'.format(self.tag.name, self.receipt.name)
 
 
-class Favorites(models.Model):
+class Favorites(CountedRelation):
+    counter_field = 'favorites_count'
+
     receipt = models.ForeignKey(
         Receipt,
         on_delete=models.CASCADE,
@@ -139,8 +407,24 @@ class Favorites(models.Model):
         related_name='favorites'
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'receipt'),
+                name='unique_favorite'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('receipt', 'user'),
+                name='favorites_rev_idx'
+            ),
+        )
+
+
+class ShoppingCart(CountedRelation):
+    counter_field = 'in_carts_count'
 
-class ShoppingCart(models.Model):
     receipt = models.ForeignKey(
         Receipt,
         on_delete=models.CASCADE,
@@ -151,3 +435,79 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='shopping_cart'
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'receipt'),
+                name='unique_shopping_cart'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('receipt', 'user'),
+                name='shopping_cart_rev_idx'
+            ),
+        )
+
+
+class FeedEntry(models.Model):
+    """Рецепт в материализованной ленте подписчика, см. api.feed.
+
+    Автор и дата публикации скопированы из рецепта, чтобы страница
+    ленты и отписка обходились без join с рецептами.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'receipt'),
+                name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-receipt'),
+                name='feed_entry_user_pub_date_idx'
+            ),
+        )
+
+
+class SimilarRecipe(models.Model):
+    """Заранее найденный похожий рецепт, см. api.similar."""
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes'
+    )
+    similar = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('receipt', 'rank'),
+                name='unique_similar_recipe_rank'
+            ),
+        )
@@ -1,14 +1,116 @@
+"""Идемпотентная загрузка ингредиентов.
+
+Запуск: python manage.py runscript loaddata \
+    [--script-args ../data/ingredients.json]
+
+Повторный запуск не создаёт дубликатов: строки вставляются пачками
+с ON CONFLICT DO NOTHING по уникальности (name, measurement_unit),
+а на PostgreSQL - через COPY FROM STDIN во временную таблицу.
+"""
 import csv
+import io
+import json
+import time
+from itertools import islice
 
+from api.caching import bump_version
+from django.db import connection, transaction
 from receipts.models import Ingredient
 
+DEFAULT_PATH = '../data/ingredients.csv'
+BATCH_SIZE = 1000
+HEADER = ['name', 'measurement_unit']
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if row and row != HEADER:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+
+class RowsFile:
+    """Файлоподобный объект для COPY: лениво отдаёт строки в формате CSV."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = io.StringIO()
+            csv.writer(line).writerow(row)
+            self.buffer += line.getvalue()
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    readline = read
+
+
+def load_with_copy(rows):
+    table = Ingredient._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE ingredient_load '
+            '(name varchar(256), measurement_unit varchar(32)) '
+            'ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_load (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            RowsFile(iter(rows))
+        )
+        cursor.execute('SELECT count(*) FROM ingredient_load')
+        read = cursor.fetchone()[0]
+        cursor.execute(
+            'INSERT INTO {0} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredient_load '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'.format(table)
+        )
+        return read
+
+
+def load_in_batches(rows):
+    rows = iter(rows)
+    read = 0
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            return read
+        read += len(batch)
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ),
+                ignore_conflicts=True
+            )
 
-def run():
-    data = '../data/ingredients.csv'
-    with open(data, encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)
 
-        for row in reader:
-            ingredients = Ingredient(name=row[0], measurement_unit=row[1])
-            ingredients.save()
+def run(*args):
+    path = args[0] if args else DEFAULT_PATH
+    rows = read_json(path) if path.endswith('.json') else read_csv(path)
+    started = time.perf_counter()
+    before = Ingredient.objects.count()
+    if connection.vendor == 'postgresql':
+        read = load_with_copy(rows)
+    else:
+        read = load_in_batches(rows)
+    created = Ingredient.objects.count() - before
+    if created:
+        # Вставка идёт в обход сигналов: сбрасываем ETag списка явно.
+        bump_version('ingredients')
+    print('{0}: read {1} rows, created {2}, skipped {3} in {4:.2f} s'.format(
+        path, read, created, read - created, time.perf_counter() - started
+    ))
@@ -0,0 +1,34 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, pre_delete
+from users.models import User
+
+from .models import Favorites, Receipt, ShoppingCart
+
+# Счётчик в Receipt, который поддерживается для каждой модели связи.
+COUNTERS = {
+    model: model.counter_field for model in (Favorites, ShoppingCart)
+}
+
+
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        field = COUNTERS[sender]
+        Receipt.objects.filter(pk=instance.receipt_id).update(
+            **{field: F(field) + 1}
+        )
+
+
+def decrement_user_counters(sender, instance, **kwargs):
+    """Перед каскадным удалением пользователя уменьшает счётчики
+    рецептов из его избранного и корзины одним UPDATE на счётчик:
+    у пользователя не больше одной связи с каждым рецептом."""
+    for model, field in COUNTERS.items():
+        Receipt.objects.filter(
+            pk__in=model.objects.filter(user=instance).values('receipt_id')
+        ).update(**{field: Greatest(F(field) - 1, 0)})
+
+
+for model in COUNTERS:
+    post_save.connect(increment_counter, sender=model)
+pre_delete.connect(decrement_user_counters, sender=User)
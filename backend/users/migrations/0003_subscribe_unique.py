@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:46
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_subscriptions(apps, schema_editor):
+    Subscribe = apps.get_model('users', 'Subscribe')
+    duplicates = (
+        Subscribe.objects
+        .order_by()
+        .values('subscriber', 'author')
+        .annotate(keep_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        Subscribe.objects.filter(
+            subscriber=duplicate['subscriber'], author=duplicate['author']
+        ).exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_subscribe'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_subscriptions, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['author', 'subscriber'], name='subscribe_rev_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscribe',
+            constraint=models.UniqueConstraint(fields=('subscriber', 'author'), name='unique_subscribe'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscribe = apps.get_model('users', 'Subscribe')
+    User.objects.update(followers_count=Coalesce(Subquery(
+        Subscribe.objects
+        .filter(author=OuterRef('pk'))
+        .order_by()
+        .values('author')
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_subscribe_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='number of subscribers'),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['followers_count'], name='user_followers_count_idx'),
+        ),
+    ]
@@ -25,6 +25,32 @@ class User(AbstractUser):
         verbose_name='password',
         max_length=128
     )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='number of subscribers',
+        default=0,
+        editable=False
+    )
+
+    class Meta(AbstractUser.Meta):
+        indexes = (
+            models.Index(
+                fields=('followers_count', ),
+                name='user_followers_count_idx'
+            ),
+        )
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        # Полное сохранение не перезаписывает счётчик подписчиков,
+        # который меняют сигналы подписок. Если строки нет, Django
+        # вставит её со всеми полями.
+        if update_fields is None:
+            values = [
+                value for value in values
+                if value[0].name != 'followers_count'
+            ]
+        return super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update)
 
 
 class Subscribe(models.Model):
@@ -40,3 +66,17 @@ class Subscribe(models.Model):
         verbose_name='subscriber',
         on_delete=models.CASCADE
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('subscriber', 'author'),
+                name='unique_subscribe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('author', 'subscriber'),
+                name='subscribe_rev_idx'
+            ),
+        )
@@ -0,0 +1,20 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+
+from .models import Subscribe, User
+
+
+def increment_followers(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1)
+
+
+def decrement_followers(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        followers_count=Greatest(F('followers_count') - 1, 0))
+
+
+post_save.connect(increment_followers, sender=Subscribe)
+post_delete.connect(decrement_followers, sender=Subscribe)